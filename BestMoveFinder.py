@@ -1,44 +1,531 @@
 import random
-import numpy as np
+import time
+
+import Evaluation
+from OpeningBook import OpeningBook
+from SearchStats import SearchStats
+from Tablebase import Tablebase, pieceCount
+from ChessEngine import CAPTURE_MOVES, QUIET_MOVES, ALL_MOVES
+from TranspositionTable import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
 
 pieceScore = {"K": 0, "Q": 9, "R": 5, "N": 3, "B": 3, "p": 1}
-CHECKMATE = 1000
+CHECKMATE = 100000  # evaluate_board works in hundredths of a pawn, mate has to outweigh any material
+MATE_THRESHOLD = CHECKMATE - 1000  # mates score CHECKMATE less the plies to them, so the quickest scores highest
 STALEMATE = 0
-DEPTH = 3
+DEPTH = 3  # search depth when no time budget is given
+MAX_DEPTH = 64  # iterative deepening stops here even if time is left
+TT_SIZE_MB = 16  # memory used by each engine's transposition table, allocated once
+RANDOMIZE_MOVE_ORDER = True  # shuffle moves before ordering, so equally ranked moves vary from game to game
+BOOK_FILE = None  # path of a Polyglot opening book (.bin), its moves are played without searching
+TABLEBASE_DIR = None  # directory of endgame tables made by Tablebase.py, positions found in them aren't searched
+TABLEBASE_PIECES = 4  # tables are probed once this many pieces are left, kings included
+TABLEBASE_WIN = CHECKMATE // 2  # score of a won table position less its DTZ, below any mate the search finds
 nextMove = None  # set a global variable to store the best possible move in current game state
 
+# move ordering, best candidates get searched first so alpha-beta cuts off early
+MVV_LVA_VALUES = {'p': 1, 'N': 2, 'B': 3, 'R': 4, 'Q': 5, 'K': 6}  # most valuable victim, least valuable attacker
+HASH_MOVE_SCORE = 1000000
+CAPTURE_SCORE = 100000  # captures & promotions, ordered by MVV-LVA on top of it
+KILLER_SCORES = (90000, 80000)  # quiet moves that caused a cutoff at same ply, newest first
+
+# quiescence search, plays out captures after the last ply so exchanges aren't cut off halfway
+QUIESCENCE_CHECK_EVASIONS = True  # when in check at a leaf, search every evasion instead of standing pat
+DELTA_MARGIN = 200  # capture is skipped if winning the piece plus this still can't raise alpha
+
+# selective search, each part can be switched off on the engine to measure what it saves
+NULL_MOVE_PRUNING = True  # if passing still fails high at reduced depth, a real move will too
+NULL_MOVE_REDUCTION = 2
+NULL_MOVE_MIN_DEPTH = 3
+LATE_MOVE_REDUCTIONS = True  # quiet moves ordered late are searched shallower, & again in full if they raise alpha
+LMR_MIN_DEPTH = 3
+LMR_FULL_DEPTH_MOVES = 3  # moves searched at full depth before reductions start
+FUTILITY_PRUNING = True  # near the leaves, quiet moves are skipped when evaluation is too far below alpha
+FUTILITY_MARGINS = (0, 200, 500)  # by depth left, most a quiet move is expected to gain
+RAZORING = True  # near the leaves, a position far below alpha only gets a quiescence search
+RAZOR_MARGINS = (0, 300, 550)
+PRINCIPAL_VARIATION_SEARCH = True  # moves after the first are searched with a null window, & again if they raise alpha
+ASPIRATION_WINDOW = 50  # each depth is first searched this close around the last one's score, 0 searches full window
+ASPIRATION_MIN_DEPTH = 3
+
+nodesSearched = 0  # nodes searched by last call of findBestMove
+
+
+class SearchTimeout(Exception):
+    # raised inside the search when time or node budget runs out or it's stopped, unwinds to findBestMove
+    pass
+
+
+class SearchEngine:
+    """
+    alpha-beta search with everything it needs: settings, transposition table, killer & history tables
+    and statistics of the last search. each engine is independent, so several can search at once in one process
+    """
+
+    def __init__(self, depth=DEPTH, timeLimit=None, maxNodes=None, ttSizeMB=TT_SIZE_MB, evaluator=None,
+                 randomizeMoveOrder=RANDOMIZE_MOVE_ORDER, seed=None, transpositionTable=None, book=None,
+                 tablebase=None, collectStats=False):
+        # settings, may be changed between searches
+        self.depth = depth  # search depth when no time budget is given
+        self.timeLimit = timeLimit  # seconds per search, None searches to depth
+        self.maxNodes = maxNodes
+        self.evaluator = evaluator  # function(gs) scoring a position for white, None uses gs.positionScore
+        self.randomizeMoveOrder = randomizeMoveOrder  # shuffle moves before ordering, so ties vary between games
+        self.quiescenceCheckEvasions = QUIESCENCE_CHECK_EVASIONS
+        self.deltaMargin = DELTA_MARGIN
+        self.nullMovePruning = NULL_MOVE_PRUNING
+        self.lateMoveReductions = LATE_MOVE_REDUCTIONS
+        self.futilityPruning = FUTILITY_PRUNING
+        self.razoring = RAZORING
+        self.principalVariationSearch = PRINCIPAL_VARIATION_SEARCH
+        self.aspirationWindow = ASPIRATION_WINDOW
+        self.random = random.Random(seed)
+        self.collectStats = collectStats  # measure each search into stats, costs time only while it's on
+        self.onIteration = None  # function(engine, gs) called after each completed depth, eg to print search info
+        # OpeningBook, or path of a Polyglot book to open. None searches every move
+        self.book = OpeningBook(book) if isinstance(book, str) else book
+        # Tablebase, or directory of table files. None searches endgames like any other position
+        self.tablebase = Tablebase(tablebase) if isinstance(tablebase, str) else tablebase
+        self.tablebasePieces = TABLEBASE_PIECES
+
+        # transposition table may be handed in, eg one shared between processes
+        self.transpositionTable = transpositionTable if transpositionTable is not None \
+            else TranspositionTable(ttSizeMB)
+        self.killerMoves = [[0, 0] for _ in range(MAX_DEPTH + 1)]  # moveIDs of 2 killer moves per ply
+        self.historyTable = [0] * 4096  # cutoffs caused by quiet moves, indexed by start square * 64 + end square
+
+        # statistics of last search
+        self.nodesSearched = 0
+        self.completedDepth = 0  # deepest iteration that finished
+        self.bestScore = 0  # score of best move at completedDepth, for side to move
+        self.pvLine = []  # principal variation of completedDepth, best move first
+        self.rootKey = 0  # zobrist key of position last searched, pvLine starts from it
+        self.elapsed = 0  # seconds spent up to end of last completed depth
+        self.bookMove = False  # last move came from the opening book, no search was run
+        self.tablebaseMove = False  # last move came from the endgame tables, no search was run
+        self.stats = None  # SearchStats of last search when collectStats is on
+
+        # state of search in progress
+        self.nextMove = None
+        self.rootDepth = depth
+        self.rootPly = 0  # moves in game state's log at root, ply of a node is counted from it
+        # triangular table, pvTable[ply] is the best line found from the node being searched at that ply
+        self.pvTable = [[] for _ in range(MAX_DEPTH + 2)]
+        self.followPv = False  # still on pvLine of last depth, its moves are tried first
+        self.deadline = None  # time.time() value at which search stops
+        self.nodeLimit = None
+        self.stopEvent = None  # threading.Event, search stops soon after it's set
+
+    def clear(self):
+        # forgets everything learnt from earlier searches, eg for a new game
+        self.transpositionTable.clear()
+        for killers in self.killerMoves:
+            killers[0] = killers[1] = 0
+        for i in range(len(self.historyTable)):
+            self.historyTable[i] = 0
+
+    def findBestMove(self, gs, validMoves, timeLimit=None, maxNodes=None, stop=None):
+        """
+        iterative deepening: searches depth 1, 2, 3... and returns best move of the last completed depth.
+        without a budget it stops at depth, with timeLimit (seconds) and/or maxNodes it goes on until budget runs
+        out, both default to the engine's settings.
+        setting the threading.Event passed as stop ends the search early, the same way running out of time does.
+        each iteration leaves its best moves in the transposition table, which orders the next one.
+        while the position is in the opening book or the endgame tables, their move is returned straight away
+        """
+        self.bookMove = False
+        self.tablebaseMove = False
+        self.rootKey = gs.zobristKey
+        self.stats = None
+        if self.book is not None:
+            move = self.book.pickMove(gs, validMoves, self.random)
+            if move is not None:
+                self.bookMove = True
+                self.nodesSearched = 0
+                self.completedDepth = 0
+                self.pvLine = [move]
+                self.nextMove = move
+                return move
+        if self.tablebase is not None and pieceCount(gs) <= self.tablebasePieces:
+            found = self.tablebase.bestMove(gs, validMoves)
+            if found is not None:
+                move, wdl, dtz = found
+                self.tablebaseMove = True
+                self.nodesSearched = 0
+                self.completedDepth = 0
+                self.bestScore = tablebaseScore(wdl, dtz)
+                self.pvLine = [move]
+                self.nextMove = move
+                return move
+
+        timeLimit = self.timeLimit if timeLimit is None else timeLimit
+        maxNodes = self.maxNodes if maxNodes is None else maxNodes
+        self.transpositionTable.newSearch()
+        startTime = time.time()
+        self.deadline = startTime + timeLimit if timeLimit is not None else None
+        self.nodeLimit = maxNodes
+        self.stopEvent = stop
+        self.nodesSearched = 0
+        self.completedDepth = 0
+        self.pvLine = []
+        for killers in self.killerMoves:
+            killers[0] = killers[1] = 0
+        for i in range(len(self.historyTable)):
+            self.historyTable[i] //= 2  # older history still helps, but counts less than this search's
+        maxDepth = self.depth if timeLimit is None and maxNodes is None else MAX_DEPTH
+        movesMade = len(gs.moveLog)
+        self.rootPly = movesMade
+        stats = None
+        if self.collectStats:
+            stats = SearchStats()
+            stats.attach(self, gs)
+
+        bestMove = None
+        try:
+            for depth in range(1, maxDepth + 1):
+                self.rootDepth = depth
+                # aspiration window around last depth's score, widened on the side it fails until score falls inside.
+                # decisive scores jump too far between depths for a window to help
+                window = self.aspirationWindow
+                if window and depth >= ASPIRATION_MIN_DEPTH and abs(self.bestScore) < TABLEBASE_WIN // 2:
+                    alpha, beta = self.bestScore - window, self.bestScore + window
+                else:
+                    alpha, beta = -CHECKMATE, CHECKMATE
+                try:
+                    while True:
+                        self.nextMove = None
+                        self.followPv = True
+                        score = self.findMoveNegaMax(gs, validMoves, depth, alpha, beta, 1 if gs.whiteToMove else -1)
+                        window *= 2
+                        if score <= alpha and alpha > -CHECKMATE:
+                            alpha = max(score - window, -CHECKMATE)
+                        elif score >= beta and beta < CHECKMATE:
+                            beta = min(score + window, CHECKMATE)
+                        else:
+                            break
+                except SearchTimeout:
+                    # take back moves the interrupted search was in the middle of
+                    while len(gs.moveLog) > movesMade:
+                        if gs.moveLog[-1] is None:
+                            gs.undoNullMove()
+                        else:
+                            gs.undoMove()
+                    if bestMove is None:
+                        bestMove = self.nextMove  # not even depth 1 finished, best of what got searched
+                    break
+                if self.nextMove is not None:
+                    bestMove = self.nextMove
+                self.completedDepth = depth
+                self.bestScore = score
+                self.pvLine = self.pvTable[0]
+                if stats is not None:
+                    stats.endIteration(self)
+                self.elapsed = time.time() - startTime
+                if self.onIteration is not None:
+                    self.onIteration(self, gs)
+                if abs(score) >= MATE_THRESHOLD:
+                    break  # forced mate found, searching deeper can't change it
+        finally:
+            # wrappers of statistics mustn't outlive the search, even one ended by an error
+            self.deadline = None
+            self.nodeLimit = None
+            self.stopEvent = None
+            if stats is not None:
+                stats.detach(self)
+                self.stats = stats
+        self.nextMove = bestMove
+        return bestMove
+
+    def principalVariation(self, gs, maxLength=MAX_DEPTH):
+        """
+        expected line of play from the position: pvLine of last search if it's from this position,
+        continued with best moves stored in transposition table where it was cut short, eg by a table hit
+        """
+        line = []
+        if gs.zobristKey == self.rootKey:
+            for move in self.pvLine[:maxLength]:
+                line.append(move)
+                gs.makeMove(move)
+        seen = set()
+        while len(line) < maxLength and gs.zobristKey not in seen:  # stored moves may lead round in a circle
+            seen.add(gs.zobristKey)
+            entry = self.transpositionTable.probe(gs.zobristKey)
+            move = None
+            if entry is not None and entry[3]:
+                move = next((move for move in gs.getValidMoves() if move.moveID == entry[3]), None)
+            if move is None:
+                break
+            line.append(move)
+            gs.makeMove(move)
+        for _ in line:
+            gs.undoMove()
+        return line
+
+    def countNode(self):
+        # counts a searched node & stops the search once its budget runs out
+        self.nodesSearched += 1
+        if self.nodesSearched & 63 == 0 or self.nodeLimit is not None:
+            # no need to look at the clock on every node, every 64 nodes keeps overshoot small
+            if (self.deadline is not None and time.time() >= self.deadline) or \
+                    (self.nodeLimit is not None and self.nodesSearched > self.nodeLimit) or \
+                    (self.stopEvent is not None and self.stopEvent.is_set()):
+                raise SearchTimeout()
+
+    def findMoveNegaMax(self, gs, validMoves, depth, alpha, beta, turnMultiplier):
+        # NegaMax with Alpha Beta Pruning
+        if depth <= 0:
+            return self.quiescenceSearch(gs, alpha, beta, turnMultiplier)
+        self.countNode()
+        ply = len(gs.moveLog) - self.rootPly  # differs from rootDepth - depth once moves are reduced
+        self.pvTable[ply] = []  # stays empty if node returns early
+
+        if self.tablebase is not None and depth != self.rootDepth and pieceCount(gs) <= self.tablebasePieces:
+            # endgame tables know the result, nothing below this node needs searching
+            result = self.tablebase.probe(gs)
+            if result is not None:
+                return tablebaseScore(*result)
+
+        # look up position in transposition table, its score may already settle this node
+        alphaOriginal = alpha
+        hashMoveID = 0
+        entry = self.transpositionTable.probe(gs.zobristKey)
+        if entry is not None:
+            entryDepth, entryScore, entryFlag, hashMoveID = entry
+            entryScore = scoreFromTable(entryScore, ply)
+            if entryDepth >= depth and depth != self.rootDepth:  # root still has to pick nextMove
+                if entryFlag == EXACT:
+                    return entryScore
+                elif entryFlag == LOWER_BOUND:
+                    alpha = max(alpha, entryScore)
+                elif entryFlag == UPPER_BOUND:
+                    beta = min(beta, entryScore)
+                if alpha >= beta:
+                    return entryScore
+
+        if self.followPv:
+            # first line searched is last depth's principal variation, even where the table lost its moves
+            if ply < len(self.pvLine):
+                hashMoveID = self.pvLine[ply].moveID
+            else:
+                self.followPv = False
+
+        # selective search isn't done at root or in check, static evaluation stays None then
+        inCheck = False
+        staticEval = None
+        if depth != self.rootDepth and \
+                (self.nullMovePruning or self.lateMoveReductions or self.futilityPruning or self.razoring):
+            inCheck = gs.isInCheck()
+            if not inCheck:
+                staticEval = turnMultiplier * (gs.positionScore if self.evaluator is None else self.evaluator(gs))
+
+        if staticEval is not None and beta - alpha == 1:
+            # pruning on static evaluation is left to nodes off the principal variation, which have a null window
+            if self.razoring and depth <= 2 and not hashMoveID and staticEval + RAZOR_MARGINS[depth] <= alpha:
+                # hopeless unless something can be won right away, which quiescence search would find
+                score = self.quiescenceSearch(gs, alpha, beta, turnMultiplier)
+                if depth == 1 or score <= alpha:
+                    return score
+            if self.nullMovePruning and depth >= NULL_MOVE_MIN_DEPTH and staticEval >= beta and \
+                    (len(gs.moveLog) == 0 or gs.moveLog[-1] is not None) and gs.hasNonPawnMaterial():
+                # never 2 null moves in a row, & not with only pawns left where passing might be the best move
+                gs.makeNullMove()
+                score = -self.findMoveNegaMax(gs, None, depth - 1 - NULL_MOVE_REDUCTION, -beta, -beta + 1,
+                                              -turnMultiplier)
+                gs.undoNullMove()
+                if score >= beta:
+                    return beta
+
+        killers = self.killerMoves[ply]
+        if validMoves is not None or hashMoveID:
+            stages = (ALL_MOVES,)  # root list, or hash move goes first & most likely cuts off whatever kind it is
+        else:
+            stages = (CAPTURE_MOVES, QUIET_MOVES)  # quiet moves are only built if no capture cuts off
+
+        maxScore = -CHECKMATE - 1  # below any score, so first move searched is best until another beats it
+        bestMove = None
+        legalMoves = 0
+        for stage in stages:
+            # moves are pseudo-legal, each is confirmed when made, so moves after a cutoff are never checked
+            moves = gs.getPseudoLegalMoves(stage) if validMoves is None else validMoves
+            self.orderMoves(moves, hashMoveID, ply)
+            for move in moves:
+                if not gs.tryMove(move):
+                    continue
+                legalMoves += 1
+                quiet = not move.isCapture and not move.pawnPromotion
+                reduction = 0
+                if staticEval is not None and quiet and legalMoves > 1:
+                    if self.futilityPruning and depth <= 2 and staticEval + FUTILITY_MARGINS[depth] <= alpha and \
+                            not gs.isInCheck():
+                        gs.undoMove()
+                        maxScore = max(maxScore, staticEval + FUTILITY_MARGINS[depth])  # most it was expected to get
+                        continue
+                    if self.lateMoveReductions and depth >= LMR_MIN_DEPTH and legalMoves > LMR_FULL_DEPTH_MOVES and \
+                            move.moveID != killers[0] and move.moveID != killers[1] and not gs.isInCheck():
+                        reduction = 1 if legalMoves <= 2 * LMR_FULL_DEPTH_MOVES else 2
+
+                score = None
+                if legalMoves > 1 and (reduction or self.principalVariationSearch):
+                    # later moves are expected to stay below alpha, a null window proves that cheaper than a full one
+                    score = -self.findMoveNegaMax(gs, None, depth - 1 - reduction, -alpha - 1, -alpha,
+                                                  -turnMultiplier)
+                    if score > alpha and reduction and self.principalVariationSearch:
+                        reduction = 0
+                        score = -self.findMoveNegaMax(gs, None, depth - 1, -alpha - 1, -alpha, -turnMultiplier)
+                if score is None or (score > alpha and (score < beta or reduction)):
+                    # first move, or one that beat alpha against expectation & needs its exact score
+                    score = -self.findMoveNegaMax(gs, None, depth - 1, -beta, -alpha, -turnMultiplier)
+                self.followPv = False
+                if score > maxScore:
+                    maxScore = score
+                    bestMove = move
+                    if score > alpha:
+                        # line through this move is the best so far, child's line was left at next ply
+                        self.pvTable[ply] = [move] + self.pvTable[ply + 1] if depth > 1 else [move]
+                    if depth == self.rootDepth:
+                        self.nextMove = move
 
-def findBestMove(gs, validMoves):
-    # helper method to make first recursive call
-    global nextMove
-    # findMoveMinMax(gs, validMoves, DEPTH, gs.whiteToMove)
-    findMoveNegaMax(gs, validMoves, DEPTH, -CHECKMATE, CHECKMATE, 1 if gs.whiteToMove else -1)
+                gs.undoMove()
+                if maxScore > alpha:  # pruning happens
+                    alpha = maxScore
+                if alpha >= beta:
+                    if quiet:
+                        # remember quiet move that refuted this line, it'll be tried early in sibling positions
+                        if killers[0] != move.moveID:
+                            killers[1] = killers[0]
+                            killers[0] = move.moveID
+                        self.historyTable[historyIndex(move)] += depth * depth
+                    break
+            if alpha >= beta:
+                break
+
+        if legalMoves == 0:
+            # no legal move: checkmate, or stalemate if king isn't attacked
+            return -CHECKMATE + ply if gs.isInCheck() else STALEMATE
+
+        if maxScore <= alphaOriginal:
+            flag = UPPER_BOUND
+        elif maxScore >= beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        self.transpositionTable.store(gs.zobristKey, depth, scoreToTable(maxScore, ply), flag,
+                                      bestMove.moveID if bestMove else 0)
+        return maxScore
+
+    def quiescenceSearch(self, gs, alpha, beta, turnMultiplier):
+        """
+        searches captures (& promotions) only, until position is quiet.
+        side to move may stand pat, i.e. take static evaluation instead of capturing
+        """
+        self.countNode()
+        if self.quiescenceCheckEvasions and gs.isInCheck():
+            # standing pat isn't an option in check, all evasions are searched
+            moves = gs.getValidMoves()
+            if len(moves) == 0:
+                return -CHECKMATE + len(gs.moveLog) - self.rootPly
+            standPat = None
+        else:
+            # evaluate_board, kept up to date by makeMove, unless another evaluator is set
+            standPat = turnMultiplier * (gs.positionScore if self.evaluator is None else self.evaluator(gs))
+            if standPat >= beta:
+                return standPat
+            if standPat > alpha:
+                alpha = standPat
+            moves = gs.getPseudoLegalMoves(CAPTURE_MOVES)  # legality is confirmed by tryMove, after pruning
+
+        orderCaptures(moves)
+        maxScore = -CHECKMATE if standPat is None else standPat
+        for move in moves:
+            if standPat is not None and move.pawnPromotion and move.promotionPiece != 'Q':
+                continue  # underpromotions hardly ever matter in a capture sequence
+            if standPat is not None and not move.pawnPromotion and \
+                    standPat + Evaluation.MATERIAL_SCORES[move.pieceCaptured[1]] + self.deltaMargin <= alpha:
+                # delta pruning, even winning the piece for free can't get this line up to alpha
+                continue
+            if not gs.tryMove(move):
+                continue
+            score = -self.quiescenceSearch(gs, -beta, -alpha, -turnMultiplier)
+            gs.undoMove()
+            if score > maxScore:
+                maxScore = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return maxScore
+
+    def orderMoves(self, moves, hashMoveID, ply):
+        """
+        sorts moves in place, best candidates first:
+        hash move, captures by MVV-LVA (promotions among them), killer moves of this ply, rest by history heuristic
+        """
+        if self.randomizeMoveOrder:
+            self.random.shuffle(moves)  # sort is stable, so this only breaks ties
+        killers = self.killerMoves[ply]
+        historyTable = self.historyTable
+
+        def moveScore(move):
+            if move.moveID == hashMoveID:
+                return HASH_MOVE_SCORE
+            if move.isCapture or move.pawnPromotion:
+                victim = MVV_LVA_VALUES[move.pieceCaptured[1]] if move.isCapture else 0
+                if move.pawnPromotion:
+                    victim += MVV_LVA_VALUES[move.promotionPiece]
+                return CAPTURE_SCORE + 10 * victim - MVV_LVA_VALUES[move.pieceMoved[1]]
+            if move.moveID == killers[0]:
+                return KILLER_SCORES[0]
+            if move.moveID == killers[1]:
+                return KILLER_SCORES[1]
+            return min(historyTable[historyIndex(move)], KILLER_SCORES[1] - 1)
+
+        moves.sort(key=moveScore, reverse=True)
+
+
+defaultEngine = SearchEngine()  # engine behind the module level findBestMove
+
+
+def findBestMove(gs, validMoves, timeLimit=None, maxNodes=None, stop=None):
+    # searches with defaultEngine, at module's DEPTH & RANDOMIZE_MOVE_ORDER. see SearchEngine.findBestMove
+    global nextMove, nodesSearched
+    defaultEngine.depth = DEPTH
+    defaultEngine.randomizeMoveOrder = RANDOMIZE_MOVE_ORDER
+    nextMove = defaultEngine.findBestMove(gs, validMoves, timeLimit, maxNodes, stop)
+    nodesSearched = defaultEngine.nodesSearched
     return nextMove
 
 
-def findMoveNegaMax(gs, validMoves, depth, alpha, beta, turnMultiplier):
-    # NegaMax with Alpha Beta Pruning
-    global nextMove
-    if depth == 0:
-        return turnMultiplier * evaluate_board(gs.board)
-    random.shuffle(validMoves)
+def scoreToTable(score, ply):
+    # mates are stored counted from the position itself, so the score holds wherever in the tree it's found again
+    if score >= MATE_THRESHOLD:
+        return score + ply
+    if score <= -MATE_THRESHOLD:
+        return score - ply
+    return score
 
-    maxScore = -CHECKMATE
-    for move in validMoves:
-        gs.makeMove(move)
-        nextMoves = gs.getValidMoves()
-        score = -findMoveNegaMax(gs, nextMoves, depth - 1, -beta, -alpha, -turnMultiplier)
-        if score > maxScore:
-            maxScore = score
-            if depth == DEPTH:
-                nextMove = move
 
-        gs.undoMove()
-        if maxScore > alpha:  # pruning happens
-            alpha = maxScore
-        if alpha >= beta:
-            break
-    return maxScore
+def scoreFromTable(score, ply):
+    # mate score read from the table, counted from root again
+    if score >= MATE_THRESHOLD:
+        return score - ply
+    if score <= -MATE_THRESHOLD:
+        return score + ply
+    return score
+
+
+def tablebaseScore(wdl, dtz):
+    # search score of a table result for side to move, quicker wins & slower losses score higher
+    return STALEMATE if wdl == 0 else wdl * (TABLEBASE_WIN - dtz)
+
+
+def orderCaptures(moves):
+    # MVV-LVA only, captures in quiescence search have no hash move or killers
+    moves.sort(key=lambda move: 10 * ((MVV_LVA_VALUES[move.pieceCaptured[1]] if move.isCapture else 0) +
+                                      (MVV_LVA_VALUES[move.promotionPiece] if move.pawnPromotion else 0)) -
+               MVV_LVA_VALUES[move.pieceMoved[1]], reverse=True)
+
+
+def historyIndex(move):
+    return (move.startRow * 8 + move.startCol) * 64 + move.endRow * 8 + move.endCol
 
 
 def findMoveMinMax(gs, validMoves, depth, whiteToMove):
@@ -124,202 +611,9 @@ def scoreBoard(gs):
     if gs.staleMate:
         return STALEMATE
 
-    score = 0
-    for row in gs.board:
-        # iterating through each square of the board, adding value of piece if white, else subtract
-        for square in row:
-            if square[0] == 'w':
-                score += pieceScore[square[1]]
-            elif square[0] == 'b':
-                score -= pieceScore[square[1]]
-
-    return score
+    return gs.materialScore  # material of white minus black, kept up to date by makeMove
 
 
 def evaluate_board(board):
-    # another way of evaluating board
-    piece_values = {'p': 1, 'N': 3, 'B': 3, 'R': 5, 'Q': 9, 'K': 0}  # Piece values
-    piece_squares = {
-        'p': np.array([
-            [8, 8, 8, 8, 8, 8, 8, 8],
-            [8, 8, 8, 8, 8, 8, 8, 8],
-            [5, 6, 6, 7, 7, 6, 6, 5],
-            [2, 2, 3, 5, 5, 3, 2, 2],
-            [1, 2, 3, 4, 4, 3, 2, 1],
-            [1, 2, 3, 3, 3, 3, 2, 1],
-            [1, 1, 1, 0, 0, 1, 1, 1],
-            [0, 0, 0, 0, 0, 0, 0, 0]
-        ]),
-        'N': np.array([
-            [0, 1, 1, 1, 1, 1, 1, 0],
-            [1, 2, 2, 2, 2, 2, 2, 1],
-            [1, 2, 3, 3, 3, 3, 2, 1],
-            [1, 2, 3, 4, 4, 3, 2, 1],
-            [1, 2, 3, 4, 4, 3, 2, 1],
-            [1, 2, 3, 3, 3, 3, 2, 1],
-            [1, 1, 2, 2, 2, 2, 2, 1],
-            [0, 1, 1, 1, 1, 1, 1, 0]
-        ]),
-        'B': np.array([
-            [1, 2, 2, 1, 1, 2, 2, 1],
-            [2, 4, 3, 2, 2, 3, 4, 2],
-            [2, 3, 4, 3, 3, 4, 3, 2],
-            [1, 2, 3, 4, 4, 3, 2, 1],
-            [1, 2, 3, 4, 4, 3, 2, 1],
-            [2, 3, 4, 3, 3, 4, 3, 2],
-            [2, 4, 3, 2, 2, 3, 4, 2],
-            [1, 2, 2, 1, 1, 2, 2, 1]
-
-        ]),
-        'R': np.array([
-            [0, 2, 2, 2, 2, 2, 2, 0],
-            [3, 3, 3, 3, 3, 3, 3, 3],
-            [1, 1, 2, 2, 2, 2, 1, 1],
-            [1, 2, 2, 2, 2, 2, 2, 1],
-            [1, 2, 2, 2, 2, 2, 2, 1],
-            [1, 1, 2, 2, 2, 2, 1, 1],
-            [1, 1, 1, 3, 3, 1, 1, 1],
-            [0, 2, 3, 4, 4, 3, 2, 0],
-        ]),
-        'Q': np.array([
-            [0, 1, 1, 3, 1, 1, 1, 0],
-            [1, 2, 3, 3, 3, 1, 1, 1],
-            [1, 4, 3, 3, 3, 4, 2, 1],
-            [1, 2, 3, 3, 3, 2, 2, 1],
-            [1, 2, 3, 3, 3, 2, 2, 1],
-            [1, 4, 3, 3, 3, 4, 2, 1],
-            [1, 2, 3, 3, 3, 1, 1, 1],
-            [0, 1, 1, 3, 1, 1, 1, 0]
-        ]),
-        'K': np.array([
-            [0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0],
-            [1, 1, 1, 0, 0, 1, 1, 1],
-            [4, 6, 4, 1, 1, 4, 6, 4],
-            [6, 8, 6, 3, 3, 6, 8, 6],
-        ])
-    }
-
-    # Initialize evaluation values
-    material_eval = 0
-    mobility_eval = 0
-    king_safety_eval = 0
-    pawn_structure_eval = 0
-    piece_activity_eval = 0
-
-    white_pawn_files = set()
-    black_pawn_files = set()
-    white_passed_pawns = 0
-    black_passed_pawns = 0
-
-    white_king_pos = None
-    black_king_pos = None
-    white_pawn_shelter = 0
-    black_pawn_shelter = 0
-    white_pawn_cover = 0
-    black_pawn_cover = 0
-    white_castled = False
-    black_castled = False
-
-    # Iterate over the board
-    for row in range(8):
-        for col in range(8):
-            piece = board[row][col]
-
-            # Evaluate material balance
-            if piece[0] == 'w':
-                material_eval += piece_values[piece[1]]
-            elif piece[0] == 'b':
-                material_eval -= piece_values[piece[1]]
-
-            # Evaluate piece-square tables
-            if piece[0] == 'w':
-                piece_activity_eval += piece_squares[piece[1]][row][col]
-            elif piece[0] == 'b':
-                piece_activity_eval -= piece_squares[piece[1]][7 - row][col]
-
-            """# Evaluate pawn structure
-            if piece == 'wp':
-                # Check for doubled pawns
-                if col in white_pawn_files:
-                    pawn_structure_eval -= 5
-                else:
-                    white_pawn_files.add(col)
-
-                # Check for isolated pawns
-                if not (col - 1 in white_pawn_files or col + 1 in white_pawn_files):
-                    pawn_structure_eval -= 10
-
-                # Check for passed pawns
-                if not np.any(board[r][col - 1:col + 2] == '--' for r in range(row + 1, 8)):
-                    white_passed_pawns += 1
-
-            elif piece == 'bp':
-                # Check for doubled pawns
-                if col in black_pawn_files:
-                    pawn_structure_eval += 5
-                else:
-                    black_pawn_files.add(col)
-
-                # Check for isolated pawns
-                if not (col - 1 in black_pawn_files or col + 1 in black_pawn_files):
-                    pawn_structure_eval += 10
-
-                # Check for passed pawns
-                if not np.any(board[r][col - 1:col + 2] == '--' for r in range(row - 1, -1, -1)):
-                    black_passed_pawns += 1
-            # Reward passed pawns and pawn majority
-            pawn_structure_eval += 5 * (white_passed_pawns - black_passed_pawns)
-            if len(white_pawn_files) > len(black_pawn_files):
-                pawn_structure_eval += 10
-            elif len(black_pawn_files) > len(white_pawn_files):
-                pawn_structure_eval -= 10
-
-            # Find king positions
-            if piece == 'wK':
-                white_king_pos = (row, col)
-            elif piece == 'bK':
-                black_king_pos = (row, col)
-
-            # Evaluate pawn shelter and pawn cover
-            if row in [6, 7]:  # White pawn rows
-                if col in [5, 6]:  # Shelter squares: g2/h2 for White
-                    white_pawn_shelter += 5
-                if col in [4, 5, 6]:  # Cover squares: f2/g2/h2 for White
-                    white_pawn_cover += 2
-            elif row in [0, 1]:  # Black pawn rows
-                if col in [5, 6]:  # Shelter squares: g7/h7 for Black
-                    black_pawn_shelter += 5
-                if col in [4, 5, 6]:  # Cover squares: f7/g7/h7 for Black
-                    black_pawn_cover += 2
-
-            # Check if kings have castled
-            if white_king_pos:
-                if white_king_pos[1] == 4 and white_king_pos[0] == 7:
-                    white_castled = True
-            if black_king_pos:
-                if black_king_pos[1] == 4 and black_king_pos[0] == 0:
-                    black_castled = True
-
-            # Reward pawn shelter and pawn cover
-            king_safety_eval += white_pawn_shelter - black_pawn_shelter + white_pawn_cover - black_pawn_cover
-
-            # Penalize for not castling
-            if not white_castled:
-                king_safety_eval -= 10
-            if not black_castled:
-                king_safety_eval += 10
-"""
-    # Combine the evaluation factors with appropriate weights and sign factor
-    evaluation = (
-            100 * material_eval +
-            10 * mobility_eval +
-            10 * king_safety_eval +
-            5 * pawn_structure_eval +
-            5 * piece_activity_eval
-    )
-
-    return evaluation
+    # material & piece-square tables, precomputed once in Evaluation, positive score is good for white
+    return Evaluation.evaluateBoard(board)
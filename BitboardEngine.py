@@ -0,0 +1,423 @@
+"""
+Bitboard backed version of ChessEngine.GameState.
+Responsible for :
+-keeping one 64-bit integer per piece type and color, next to the regular 8x8 board
+-determining valid moves using precomputed attack tables instead of probing the board square by square
+GameState in this module is a drop-in replacement, so BestMoveFinder and ChessMain can use either one.
+"""
+
+import ChessEngine
+from ChessEngine import Move, addPawnMove, CAPTURE_MOVES, QUIET_MOVES, ALL_MOVES
+
+# square index is row * 8 + col, so bit 0 is a8 and bit 63 is h1 (same orientation as the board array)
+FULL_BOARD = (1 << 64) - 1
+PIECES = ('wp', 'wN', 'wB', 'wR', 'wQ', 'wK', 'bp', 'bN', 'bB', 'bR', 'bQ', 'bK')
+
+
+def squareBit(row, col):
+    return 1 << (row * 8 + col)
+
+
+def iterateBits(bitboard):
+    # yields index of every set bit, lowest first
+    while bitboard:
+        lowestBit = bitboard & -bitboard
+        yield lowestBit.bit_length() - 1
+        bitboard ^= lowestBit
+
+
+def _stepAttacks(offsets):
+    # attack table for pieces moving a single step in fixed offsets (knight & king)
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        attacks = 0
+        for dRow, dCol in offsets:
+            if 0 <= row + dRow < 8 and 0 <= col + dCol < 8:
+                attacks |= squareBit(row + dRow, col + dCol)
+        table.append(attacks)
+    return table
+
+
+FILE_A = sum(squareBit(r, 0) for r in range(8))
+FILE_H = sum(squareBit(r, 7) for r in range(8))
+
+KNIGHT_ATTACKS = _stepAttacks(((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)))
+KING_ATTACKS = _stepAttacks(((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)))
+# squares attacked by a pawn standing on the square, white pawns move up the board (towards row 0)
+PAWN_ATTACKS = {'w': _stepAttacks(((-1, -1), (-1, 1))), 'b': _stepAttacks(((1, -1), (1, 1)))}
+
+# each slider line is a pair of opposite directions: rank, file, diagonal and anti-diagonal
+LINES = (((0, -1), (0, 1)), ((-1, 0), (1, 0)), ((-1, -1), (1, 1)), ((-1, 1), (1, -1)))
+
+
+def _ray(sq, direction, occupancy):
+    # squares reached from sq in one direction, stopping at (and including) the first occupied square
+    row, col = divmod(sq, 8)
+    attacks = 0
+    row, col = row + direction[0], col + direction[1]
+    while 0 <= row < 8 and 0 <= col < 8:
+        bit = squareBit(row, col)
+        attacks |= bit
+        if occupancy & bit:
+            break
+        row, col = row + direction[0], col + direction[1]
+    return attacks
+
+
+def _lineTables(line):
+    """
+    for every square, mask of the squares on the line that can block (board edges never block)
+    and a table mapping each possible blocker set on that mask to the attacked squares
+    """
+    masks = []
+    tables = []
+    for sq in range(64):
+        mask = 0
+        for dRow, dCol in line:
+            # the last square of each ray is on the edge, whatever stands there can't block anything further
+            row, col = divmod(sq, 8)
+            while 0 <= row + 2 * dRow < 8 and 0 <= col + 2 * dCol < 8:
+                row, col = row + dRow, col + dCol
+                mask |= squareBit(row, col)
+        table = {}
+        blockers = 0
+        while True:
+            # enumerates every subset of the mask (carry-rippler)
+            table[blockers] = _ray(sq, line[0], blockers) | _ray(sq, line[1], blockers)
+            blockers = (blockers - mask) & mask
+            if blockers == 0:
+                break
+        masks.append(mask)
+        tables.append(table)
+    return masks, tables
+
+
+RANK_MASKS, RANK_ATTACKS = _lineTables(LINES[0])
+FILE_MASKS, FILE_ATTACKS = _lineTables(LINES[1])
+DIAGONAL_MASKS, DIAGONAL_ATTACKS = _lineTables(LINES[2])
+ANTI_DIAGONAL_MASKS, ANTI_DIAGONAL_ATTACKS = _lineTables(LINES[3])
+
+
+def rookAttacks(sq, occupancy):
+    return RANK_ATTACKS[sq][occupancy & RANK_MASKS[sq]] | FILE_ATTACKS[sq][occupancy & FILE_MASKS[sq]]
+
+
+def bishopAttacks(sq, occupancy):
+    return (DIAGONAL_ATTACKS[sq][occupancy & DIAGONAL_MASKS[sq]] |
+            ANTI_DIAGONAL_ATTACKS[sq][occupancy & ANTI_DIAGONAL_MASKS[sq]])
+
+
+def queenAttacks(sq, occupancy):
+    return rookAttacks(sq, occupancy) | bishopAttacks(sq, occupancy)
+
+
+def _betweenAndLineTables():
+    # BETWEEN[a][b]: squares strictly between two aligned squares,
+    # LINE[a][b]: whole line through both (0 if not aligned)
+    between = [[0] * 64 for _ in range(64)]
+    line = [[0] * 64 for _ in range(64)]
+    for sq in range(64):
+        for directions in LINES:
+            fullLine = _ray(sq, directions[0], 0) | _ray(sq, directions[1], 0) | (1 << sq)
+            for direction in directions:
+                row, col = divmod(sq, 8)
+                squares = 0
+                row, col = row + direction[0], col + direction[1]
+                while 0 <= row < 8 and 0 <= col < 8:
+                    target = row * 8 + col
+                    between[sq][target] = squares
+                    line[sq][target] = fullLine
+                    squares |= 1 << target
+                    row, col = row + direction[0], col + direction[1]
+    return between, line
+
+
+BETWEEN, LINE = _betweenAndLineTables()
+
+# king & rook squares for castling: (king square, squares that must be empty, squares king passes, rook square)
+CASTLE_SQUARES = {
+    'wks': (60, squareBit(7, 5) | squareBit(7, 6), (61, 62), 63),
+    'wqs': (60, squareBit(7, 1) | squareBit(7, 2) | squareBit(7, 3), (59, 58), 56),
+    'bks': (4, squareBit(0, 5) | squareBit(0, 6), (5, 6), 7),
+    'bqs': (4, squareBit(0, 1) | squareBit(0, 2) | squareBit(0, 3), (3, 2), 0),
+}
+
+
+class GameState(ChessEngine.GameState):
+    def __init__(self):
+        super().__init__()
+        # bitboard of every piece ( eg, bitboards['wN'] has a bit set on each white knight's square )
+        self.bitboards = {}
+        self.occupancy = {}  # all white / all black pieces
+        self.syncBitboards()
+
+    def loadFen(self, fen):
+        super().loadFen(fen)
+        self.syncBitboards()
+
+    def syncBitboards(self):
+        # rebuilds every bitboard from the board array, needed only when the board is edited directly
+        self.bitboards = {piece: 0 for piece in PIECES}
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r, c]
+                if piece != '--':
+                    self.bitboards[piece] |= squareBit(r, c)
+        self.occupancy = {color: 0 for color in 'wb'}
+        for piece, bitboard in self.bitboards.items():
+            self.occupancy[piece[0]] |= bitboard
+
+    def makeMove(self, move):
+        super().makeMove(move)
+        self.toggleMove(move, self.board[move.endRow, move.endCol])
+
+    def undoMove(self):
+        if len(self.moveLog):
+            move = self.moveLog[-1]
+            placedPiece = self.board[move.endRow, move.endCol]  # differs from piece moved on promotion
+            super().undoMove()
+            self.toggleMove(move, placedPiece)
+
+    def toggleMove(self, move, placedPiece):
+        # flips every bit touched by the move, which both makes and un-makes it on the bitboards
+        bitboards = self.bitboards
+        occupancy = self.occupancy
+        fromBit = 1 << (move.startRow * 8 + move.startCol)
+        toBit = 1 << (move.endRow * 8 + move.endCol)
+        color = move.pieceMoved[0]
+
+        bitboards[move.pieceMoved] ^= fromBit
+        bitboards[placedPiece] ^= toBit
+        occupancy[color] ^= fromBit | toBit
+
+        if move.isEnpassantMove:
+            captureBit = 1 << (move.startRow * 8 + move.endCol)
+        elif move.pieceCaptured != '--':
+            captureBit = toBit
+        else:
+            captureBit = 0
+        if captureBit:
+            bitboards[move.pieceCaptured] ^= captureBit
+            occupancy[move.pieceCaptured[0]] ^= captureBit
+
+        if move.isCastleMove:
+            if move.endCol - move.startCol == 2:  # king side castle
+                rookBits = squareBit(move.endRow, move.endCol + 1) | squareBit(move.endRow, move.endCol - 1)
+            else:
+                rookBits = squareBit(move.endRow, move.endCol - 2) | squareBit(move.endRow, move.endCol + 1)
+            bitboards[color + 'R'] ^= rookBits
+            occupancy[color] ^= rookBits
+
+    def attackersTo(self, sq, color, occupied):
+        # bitboard of all pieces of given color attacking the square, with sliders blocked by 'occupied'
+        bitboards = self.bitboards
+        enemy = 'b' if color == 'w' else 'w'
+        queens = bitboards[color + 'Q']
+        return ((KNIGHT_ATTACKS[sq] & bitboards[color + 'N']) |
+                (KING_ATTACKS[sq] & bitboards[color + 'K']) |
+                (PAWN_ATTACKS[enemy][sq] & bitboards[color + 'p']) |
+                (rookAttacks(sq, occupied) & (bitboards[color + 'R'] | queens)) |
+                (bishopAttacks(sq, occupied) & (bitboards[color + 'B'] | queens)))
+
+    def attackedSquares(self, color, occupied):
+        # every square attacked by given color
+        bitboards = self.bitboards
+        attacked = 0
+        pawns = bitboards[color + 'p']
+        if color == 'w':
+            attacked |= ((pawns & ~FILE_A) >> 9) | ((pawns & ~FILE_H) >> 7)
+        else:
+            attacked |= ((pawns & ~FILE_A) << 7) | ((pawns & ~FILE_H) << 9)
+        for sq in iterateBits(bitboards[color + 'N']):
+            attacked |= KNIGHT_ATTACKS[sq]
+        queens = bitboards[color + 'Q']
+        for sq in iterateBits(bitboards[color + 'B'] | queens):
+            attacked |= bishopAttacks(sq, occupied)
+        for sq in iterateBits(bitboards[color + 'R'] | queens):
+            attacked |= rookAttacks(sq, occupied)
+        for sq in iterateBits(bitboards[color + 'K']):
+            attacked |= KING_ATTACKS[sq]
+        return attacked & FULL_BOARD
+
+    def getValidMoves(self):
+        # all legal moves, generated in a single pass using check & pin masks
+        moves = self.generateLegalMoves()
+        if len(moves) == 0:
+            if self.inCheck:
+                self.checkMate = True
+            else:
+                self.staleMate = True
+        else:
+            self.checkMate = False
+            self.staleMate = False
+        return moves
+
+    def hasNonPawnMaterial(self):
+        color = 'w' if self.whiteToMove else 'b'
+        bitboards = self.bitboards
+        return (bitboards[color + 'N'] | bitboards[color + 'B'] | bitboards[color + 'R'] | bitboards[color + 'Q']) != 0
+
+    def isInCheck(self):
+        ally, enemy = ('w', 'b') if self.whiteToMove else ('b', 'w')
+        kingSq = self.bitboards[ally + 'K'].bit_length() - 1
+        return self.attackersTo(kingSq, enemy, self.occupancy['w'] | self.occupancy['b']) != 0
+
+    def squareAttacked(self, r, c, attackerColor):
+        return self.attackersTo(r * 8 + c, attackerColor, self.occupancy['w'] | self.occupancy['b']) != 0
+
+    def getPseudoLegalMoves(self, stage=ALL_MOVES):
+        # moves that may leave own king in check, for search to confirm with tryMove. no pin, check or attack masks
+        moves = []
+        board = self.board
+        bitboards = self.bitboards
+        ally, enemy = ('w', 'b') if self.whiteToMove else ('b', 'w')
+        enemies = self.occupancy[enemy]
+        occupied = self.occupancy[ally] | enemies
+        kingSq = bitboards[ally + 'K'].bit_length() - 1
+
+        targetMask = 0
+        if stage & CAPTURE_MOVES:
+            targetMask |= enemies
+        if stage & QUIET_MOVES:
+            targetMask |= ~occupied & FULL_BOARD
+
+        kingStart = divmod(kingSq, 8)
+        for sq in iterateBits(KING_ATTACKS[kingSq] & targetMask):
+            moves.append(Move(kingStart, divmod(sq, 8), board))
+        if stage & QUIET_MOVES:
+            # path squares are checked for attacks by tryMove
+            self.getCastleMovesBitboard(ally, kingSq, occupied, 0, moves)
+
+        queens = bitboards[ally + 'Q']
+        for sq in iterateBits(bitboards[ally + 'N']):
+            start = divmod(sq, 8)
+            for target in iterateBits(KNIGHT_ATTACKS[sq] & targetMask):
+                moves.append(Move(start, divmod(target, 8), board))
+        for pieces, attackFunction in ((bitboards[ally + 'B'] | queens, bishopAttacks),
+                                       (bitboards[ally + 'R'] | queens, rookAttacks)):
+            for sq in iterateBits(pieces):
+                start = divmod(sq, 8)
+                for target in iterateBits(attackFunction(sq, occupied) & targetMask):
+                    moves.append(Move(start, divmod(target, 8), board))
+
+        self.getPawnMovesBitboard(ally, enemy, kingSq, occupied, FULL_BOARD, {}, moves, stage)
+        return moves
+
+    def generateLegalMoves(self):
+        moves = []
+        board = self.board
+        bitboards = self.bitboards
+        ally, enemy = ('w', 'b') if self.whiteToMove else ('b', 'w')
+        own = self.occupancy[ally]
+        occupied = own | self.occupancy[enemy]
+        kingBit = bitboards[ally + 'K']
+        kingSq = kingBit.bit_length() - 1
+
+        checkers = self.attackersTo(kingSq, enemy, occupied)
+        self.inCheck = checkers != 0
+        # king can't step back along the checking line, so it's taken out of the occupancy
+        attacked = self.attackedSquares(enemy, occupied ^ kingBit)
+
+        # squares pieces may move to
+        targetMask = ~own & FULL_BOARD
+
+        kingRow, kingCol = divmod(kingSq, 8)
+        for sq in iterateBits(KING_ATTACKS[kingSq] & targetMask & ~attacked):
+            moves.append(Move((kingRow, kingCol), divmod(sq, 8), board))
+
+        if checkers & (checkers - 1) == 0:  # double check, only king moves are legal
+            if checkers:
+                # capture the checking piece or block the line to it
+                checkMask = checkers | BETWEEN[kingSq][checkers.bit_length() - 1]
+            else:
+                checkMask = FULL_BOARD
+                self.getCastleMovesBitboard(ally, kingSq, occupied, attacked, moves)
+
+            pinned, pinLines = self.findPins(ally, enemy, kingSq, own, occupied)
+            targetMask &= checkMask
+
+            queens = bitboards[ally + 'Q']
+            pieceAttacks = ((bitboards[ally + 'N'], None), (bitboards[ally + 'B'] | queens, bishopAttacks),
+                            (bitboards[ally + 'R'] | queens, rookAttacks))
+            for pieces, attackFunction in pieceAttacks:
+                for sq in iterateBits(pieces):
+                    if attackFunction is None:
+                        if sq in pinLines:  # pinned knight can never move
+                            continue
+                        targets = KNIGHT_ATTACKS[sq] & targetMask
+                    else:
+                        targets = attackFunction(sq, occupied) & targetMask
+                        if sq in pinLines:
+                            targets &= pinLines[sq]
+                    start = divmod(sq, 8)
+                    for target in iterateBits(targets):
+                        moves.append(Move(start, divmod(target, 8), board))
+
+            self.getPawnMovesBitboard(ally, enemy, kingSq, occupied, checkMask, pinLines, moves)
+        return moves
+
+    def findPins(self, ally, enemy, kingSq, own, occupied):
+        # returns bitboard of pinned pieces and line each pinned piece is allowed to move along
+        bitboards = self.bitboards
+        queens = bitboards[enemy + 'Q']
+        snipers = ((rookAttacks(kingSq, 0) & (bitboards[enemy + 'R'] | queens)) |
+                   (bishopAttacks(kingSq, 0) & (bitboards[enemy + 'B'] | queens)))
+        pinned = 0
+        pinLines = {}
+        for sniperSq in iterateBits(snipers):
+            blockers = BETWEEN[kingSq][sniperSq] & occupied
+            if blockers and blockers & (blockers - 1) == 0 and blockers & own:
+                pinned |= blockers
+                pinLines[blockers.bit_length() - 1] = LINE[kingSq][sniperSq]
+        return pinned, pinLines
+
+    def getPawnMovesBitboard(self, ally, enemy, kingSq, occupied, checkMask, pinLines, moves, stage=ALL_MOVES):
+        # pawn pushes, captures, promotions & en-passant. promoting pushes belong to the CAPTURE_MOVES stage
+        board = self.board
+        pawns = self.bitboards[ally + 'p']
+        enemies = self.occupancy[enemy]
+        forward, startRow, backRow = (-8, 6, 0) if ally == 'w' else (8, 1, 7)
+
+        for sq in iterateBits(pawns):
+            row, col = divmod(sq, 8)
+            allowed = checkMask
+            if sq in pinLines:
+                allowed &= pinLines[sq]
+            pawnPromotion = row + forward // 8 == backRow
+
+            oneStep = sq + forward
+            if not occupied & (1 << oneStep) and stage & (CAPTURE_MOVES if pawnPromotion else QUIET_MOVES):
+                if allowed & (1 << oneStep):
+                    addPawnMove(moves, (row, col), divmod(oneStep, 8), board, pawnPromotion)
+                twoStep = oneStep + forward
+                if row == startRow and stage & QUIET_MOVES and not occupied & (1 << twoStep) and \
+                        allowed & (1 << twoStep):
+                    moves.append(Move((row, col), divmod(twoStep, 8), board))
+
+            if stage & CAPTURE_MOVES:
+                for target in iterateBits(PAWN_ATTACKS[ally][sq] & enemies & allowed):
+                    addPawnMove(moves, (row, col), divmod(target, 8), board, pawnPromotion)
+
+        if self.enpassantPossible != () and stage & CAPTURE_MOVES:
+            epRow, epCol = self.enpassantPossible
+            epSq = epRow * 8 + epCol
+            capturedSq = epSq - forward
+            for sq in iterateBits(PAWN_ATTACKS[enemy][epSq] & pawns):
+                # play the capture on a copy of the occupancy & see if king ends up attacked
+                afterOccupied = occupied ^ (1 << sq) ^ (1 << epSq) ^ (1 << capturedSq)
+                if not self.attackersTo(kingSq, enemy, afterOccupied) & ~(1 << capturedSq):
+                    moves.append(Move(divmod(sq, 8), (epRow, epCol), board, isEnpassantMove=True))
+
+    def getCastleMovesBitboard(self, ally, kingSq, occupied, attacked, moves):
+        rights = self.currentCastlingRight
+        for side in ('ks', 'qs'):
+            if not getattr(rights, ally + side):
+                continue
+            castleKingSq, emptySquares, kingPath, rookSq = CASTLE_SQUARES[ally + side]
+            if kingSq != castleKingSq or not self.bitboards[ally + 'R'] & (1 << rookSq):
+                continue
+            if occupied & emptySquares or any(attacked & (1 << sq) for sq in kingPath):
+                continue
+            moves.append(Move(divmod(kingSq, 8), divmod(kingPath[1], 8), self.board, isCastleMove=True))
+
@@ -3,12 +3,36 @@ Responsible for :
 -storing all information about current state of chess game.
 -determining valid moves at current state.
 -keep move log
+-reading & writing positions as FEN strings
 """
 
+import random
+
 import numpy as np
 
+import Evaluation
+
 DIMENSION = 8
 
+# random 64-bit numbers for Zobrist hashing, seeded so a position gets the same key in every run
+_zobristRandom = random.Random(20230601)
+ZOBRIST_PIECES = {color + piece: [_zobristRandom.getrandbits(64) for _ in range(64)]
+                  for color in 'wb' for piece in 'pNBRQK'}  # indexed by square, row * 8 + col
+ZOBRIST_BLACK_TO_MOVE = _zobristRandom.getrandbits(64)
+ZOBRIST_CASTLING = [_zobristRandom.getrandbits(64) for _ in range(16)]  # indexed by CastleRights.index()
+ZOBRIST_ENPASSANT = [_zobristRandom.getrandbits(64) for _ in range(8)]  # indexed by column of en-passant square
+
+ROOK_DIRECTIONS = ((-1, 0), (0, -1), (1, 0), (0, 1))
+BISHOP_DIRECTIONS = ((-1, -1), (1, -1), (1, 1), (-1, 1))
+KING_DIRECTIONS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+KNIGHT_DIRECTIONS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+PROMOTION_PIECES = ('Q', 'R', 'B', 'N')  # queen first, so it's picked when a move is matched only by squares
+
+# stages of pseudo-legal generation, search asks for captures first & builds quiet moves only if it still needs them
+CAPTURE_MOVES = 1  # captures, en-passant & promotions
+QUIET_MOVES = 2  # everything else, castling included
+ALL_MOVES = CAPTURE_MOVES | QUIET_MOVES
+
 
 class GameState:
     def __init__(self):
@@ -42,21 +66,179 @@ class GameState:
         self.inCheck = False
         self.pins = []  # pinned pieces to the king
         self.checks = []  # enemy square that gave the check
+        self.pinDirections = {}  # (row, col) of each pinned piece -> direction of its pin
+        self.enemyAttacks = set()  # squares the enemy attacks, found with our king lifted off the board
         self.checkMate = False
         self.staleMate = False
 
         self.enpassantPossible = ()  # coordinates of square, where enpassant is possible
         self.enpassantLog = [self.enpassantPossible]
 
+        # move clocks, as in FEN
+        self.halfmoveClock = 0  # moves since last capture or pawn move, for fifty move rule
+        self.fullmoveNumber = 1  # goes up after every black move
+        self.halfmoveClockLog = [self.halfmoveClock]
+
         # variable to store castling rights
         self.currentCastlingRight = CastleRights(True, True, True, True)
         self.castleRightLog = [
             CastleRights(self.currentCastlingRight.wks, self.currentCastlingRight.wqs, self.currentCastlingRight.bks,
                          self.currentCastlingRight.bqs)]
 
+        # Zobrist key of current position & key of every position before it, updated by makeMove / undoMove
+        self.zobristKey = self.computeZobristKey()
+        self.zobristLog = [self.zobristKey]
+
+        # running evaluation, kept up to date by makeMove / undoMove instead of rescanning the board
+        self.materialScore = 0  # material balance in pawns, positive when white is ahead
+        self.positionScore = 0  # material & piece-square score, same value Evaluation.evaluateBoard gives
+        self.refreshEvaluation()
+        self.evaluationLog = [(self.materialScore, self.positionScore)]
+
+    @classmethod
+    def fromFen(cls, fen):
+        # new game state at the position of a FEN string, the same for subclasses
+        gs = cls()
+        gs.loadFen(fen)
+        return gs
+
+    def loadFen(self, fen):
+        """
+        sets up the position of a FEN string, eg "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1".
+        move clocks may be left out (EPD style). move log starts empty, so it costs the same for any position.
+        raises ValueError if the string isn't a valid FEN, game state is left unchanged then
+        """
+        fields = fen.split()
+        if not 4 <= len(fields) <= 6:
+            raise ValueError("FEN needs 4 to 6 fields: " + fen)
+        rowTexts = fields[0].split('/')
+        if len(rowTexts) != 8:
+            raise ValueError("FEN board needs 8 ranks: " + fen)
+
+        board = np.empty((8, 8), dtype=object)
+        board.fill('--')
+        kingLocations = {'w': [], 'b': []}
+        for r, rowText in enumerate(rowTexts):
+            c = 0
+            for char in rowText:
+                if char in '12345678':
+                    c += int(char)
+                    continue
+                if char.upper() not in 'PNBRQK' or c >= 8:
+                    raise ValueError("bad rank '" + rowText + "' in FEN: " + fen)
+                color = 'w' if char.isupper() else 'b'
+                board[r, c] = color + (char.upper() if char.upper() != 'P' else 'p')
+                if char.upper() == 'K':
+                    kingLocations[color].append((r, c))
+                c += 1
+            if c != 8:
+                raise ValueError("rank '" + rowText + "' in FEN isn't 8 squares: " + fen)
+        if len(kingLocations['w']) != 1 or len(kingLocations['b']) != 1:
+            raise ValueError("FEN needs exactly one king of each color: " + fen)
+
+        if fields[1] not in ('w', 'b'):
+            raise ValueError("side to move in FEN must be w or b: " + fen)
+        castling = fields[2]
+        if castling != '-' and (not castling or any(char not in 'KQkq' for char in castling)):
+            raise ValueError("bad castling rights in FEN: " + fen)
+        # a right is only kept if king & rook are still on their squares, so generators can rely on it
+        rights = CastleRights('K' in castling and board[7, 4] == 'wK' and board[7, 7] == 'wR',
+                              'Q' in castling and board[7, 4] == 'wK' and board[7, 0] == 'wR',
+                              'k' in castling and board[0, 4] == 'bK' and board[0, 7] == 'bR',
+                              'q' in castling and board[0, 4] == 'bK' and board[0, 0] == 'bR')
+        enpassant = fields[3]
+        if enpassant == '-':
+            enpassantPossible = ()
+        elif len(enpassant) == 2 and enpassant[0] in Move.filesToCols and \
+                enpassant[1] == ('6' if fields[1] == 'w' else '3'):
+            enpassantPossible = (Move.ranksToRows[enpassant[1]], Move.filesToCols[enpassant[0]])
+        else:
+            raise ValueError("bad en-passant square in FEN: " + fen)
+        clocks = fields[4:] + ['0', '1'][len(fields) - 4:]
+        if not all(clock.isdigit() for clock in clocks):
+            raise ValueError("move clocks in FEN must be numbers: " + fen)
+
+        self.board = board
+        self.whiteToMove = fields[1] == 'w'
+        self.whiteKingLocation = kingLocations['w'][0]
+        self.blackKingLocation = kingLocations['b'][0]
+        self.moveLog = []
+        self.inCheck = False
+        self.pins = []
+        self.checks = []
+        self.checkMate = False
+        self.staleMate = False
+        self.enpassantPossible = enpassantPossible
+        self.enpassantLog = [enpassantPossible]
+        self.currentCastlingRight = rights
+        self.castleRightLog = [CastleRights(rights.wks, rights.wqs, rights.bks, rights.bqs)]
+        self.halfmoveClock = int(clocks[0])
+        self.fullmoveNumber = max(int(clocks[1]), 1)
+        self.halfmoveClockLog = [self.halfmoveClock]
+        self.zobristKey = self.computeZobristKey()
+        self.zobristLog = [self.zobristKey]
+        self.refreshEvaluation()
+        self.evaluationLog = [(self.materialScore, self.positionScore)]
+
+    def toFen(self):
+        # FEN string of current position, with castling rights, en-passant square & move clocks
+        rowTexts = []
+        for r in range(DIMENSION):
+            rowText = ''
+            empty = 0
+            for c in range(DIMENSION):
+                piece = self.board[r, c]
+                if piece == '--':
+                    empty += 1
+                    continue
+                if empty:
+                    rowText += str(empty)
+                    empty = 0
+                char = 'P' if piece[1] == 'p' else piece[1]
+                rowText += char if piece[0] == 'w' else char.lower()
+            if empty:
+                rowText += str(empty)
+            rowTexts.append(rowText)
+
+        rights = self.currentCastlingRight
+        castling = ''.join(char for char, right in zip('KQkq', (rights.wks, rights.wqs, rights.bks, rights.bqs))
+                           if right) or '-'
+        if self.enpassantPossible == ():
+            enpassant = '-'
+        else:
+            enpassant = Move.colsToFiles[self.enpassantPossible[1]] + Move.rowsToRanks[self.enpassantPossible[0]]
+        return ' '.join(('/'.join(rowTexts), 'w' if self.whiteToMove else 'b', castling, enpassant,
+                         str(self.halfmoveClock), str(self.fullmoveNumber)))
+
+    def refreshEvaluation(self):
+        # recomputes running scores from the board, needed after Evaluation tables are reloaded
+        self.materialScore = 0
+        for piece in self.board.flat:
+            self.materialScore += Evaluation.PIECE_MATERIAL[piece]
+        self.positionScore = Evaluation.evaluateBoard(self.board)
+
+    def computeZobristKey(self):
+        # hashes the position from scratch: pieces, side to move, castling rights & en-passant square
+        key = 0
+        for r in range(DIMENSION):
+            for c in range(DIMENSION):
+                piece = self.board[r, c]
+                if piece != '--':
+                    key ^= ZOBRIST_PIECES[piece][r * 8 + c]
+        if not self.whiteToMove:
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        key ^= ZOBRIST_CASTLING[self.currentCastlingRight.index()]
+        if self.enpassantPossible != ():
+            key ^= ZOBRIST_ENPASSANT[self.enpassantPossible[1]]
+        return key
+
     def makeMove(self, move):
         # Takes move as parameter & executes it, doesn't include Castling & en-passant
 
+        # state before the move, needed to update the Zobrist key
+        previousCastleIndex = self.currentCastlingRight.index()
+        previousEnpassant = self.enpassantPossible
+
         self.board[move.startRow, move.startCol] = '--'  # empties the cell from where piece moved
         self.board[move.endRow, move.endCol] = move.pieceMoved
         self.moveLog.append(move)  # log the move to be able to undo it later
@@ -71,7 +253,7 @@ class GameState:
 
         # pawn promotion
         if move.pawnPromotion:
-            self.board[move.endRow, move.endCol] = move.pieceMoved[0] + 'Q'
+            self.board[move.endRow, move.endCol] = move.pieceMoved[0] + move.promotionPiece
 
         # Enpassant move
         if move.isEnpassantMove:
@@ -99,6 +281,70 @@ class GameState:
                          self.currentCastlingRight.bqs))
         self.enpassantLog.append(self.enpassantPossible)
 
+        self.updateZobristKey(move, previousCastleIndex, previousEnpassant)
+        self.zobristLog.append(self.zobristKey)
+        self.updateEvaluation(move)
+        self.evaluationLog.append((self.materialScore, self.positionScore))
+
+        self.halfmoveClock = 0 if move.pieceMoved[1] == 'p' or move.isCapture else self.halfmoveClock + 1
+        self.halfmoveClockLog.append(self.halfmoveClock)
+        if move.pieceMoved[0] == 'b':
+            self.fullmoveNumber += 1
+
+    def updateEvaluation(self, move):
+        # a move changes at most 4 squares, so only their table entries are added or taken away
+        squareScores = Evaluation.SQUARE_SCORES
+        startSq = move.startRow * 8 + move.startCol
+        endSq = move.endRow * 8 + move.endCol
+        placedPiece = move.pieceMoved[0] + move.promotionPiece if move.pawnPromotion else move.pieceMoved
+        score = self.positionScore - squareScores[move.pieceMoved][startSq] + squareScores[placedPiece][endSq]
+        material = self.materialScore
+
+        if move.isCapture:
+            capturedSq = move.startRow * 8 + move.endCol if move.isEnpassantMove else endSq
+            score -= squareScores[move.pieceCaptured][capturedSq]
+            material -= Evaluation.PIECE_MATERIAL[move.pieceCaptured]
+        if move.pawnPromotion:
+            material += Evaluation.PIECE_MATERIAL[placedPiece] - Evaluation.PIECE_MATERIAL[move.pieceMoved]
+
+        if move.isCastleMove:
+            rook = squareScores[move.pieceMoved[0] + 'R']
+            if move.endCol - move.startCol == 2:  # king side castle
+                score += rook[endSq - 1] - rook[endSq + 1]
+            else:
+                score += rook[endSq + 1] - rook[endSq - 2]
+        self.materialScore = material
+        self.positionScore = score
+
+    def updateZobristKey(self, move, previousCastleIndex, previousEnpassant):
+        # XORs out what the move changed & XORs in the new state, instead of hashing the whole board again
+        startSq = move.startRow * 8 + move.startCol
+        endSq = move.endRow * 8 + move.endCol
+        placedPiece = move.pieceMoved[0] + move.promotionPiece if move.pawnPromotion else move.pieceMoved
+        key = self.zobristKey ^ ZOBRIST_BLACK_TO_MOVE
+        key ^= ZOBRIST_PIECES[move.pieceMoved][startSq] ^ ZOBRIST_PIECES[placedPiece][endSq]
+
+        if move.isEnpassantMove:
+            key ^= ZOBRIST_PIECES[move.pieceCaptured][move.startRow * 8 + move.endCol]
+        elif move.pieceCaptured != '--':
+            key ^= ZOBRIST_PIECES[move.pieceCaptured][endSq]
+
+        if move.isCastleMove:
+            rook = ZOBRIST_PIECES[move.pieceMoved[0] + 'R']
+            if move.endCol - move.startCol == 2:  # king side castle
+                key ^= rook[endSq + 1] ^ rook[endSq - 1]
+            else:
+                key ^= rook[endSq - 2] ^ rook[endSq + 1]
+
+        castleIndex = self.currentCastlingRight.index()
+        if castleIndex != previousCastleIndex:
+            key ^= ZOBRIST_CASTLING[previousCastleIndex] ^ ZOBRIST_CASTLING[castleIndex]
+        if previousEnpassant != ():
+            key ^= ZOBRIST_ENPASSANT[previousEnpassant[1]]
+        if self.enpassantPossible != ():
+            key ^= ZOBRIST_ENPASSANT[self.enpassantPossible[1]]
+        self.zobristKey = key
+
     def undoMove(self):
         # undo last move
 
@@ -135,12 +381,59 @@ class GameState:
 
             # undo castle rights
             self.castleRightLog.pop()  # removing last castle rights
-            self.currentCastlingRight = self.castleRightLog[-1]
-            # updating caste rights to the last castle rights before move
+            lastRights = self.castleRightLog[-1]
+            self.currentCastlingRight = CastleRights(lastRights.wks, lastRights.wqs, lastRights.bks, lastRights.bqs)
+            # updating caste rights to a copy of the last castle rights before move,
+            # so updateCastleRights can't modify the logged ones
+
+            self.zobristLog.pop()
+            self.zobristKey = self.zobristLog[-1]
+            self.evaluationLog.pop()
+            self.materialScore, self.positionScore = self.evaluationLog[-1]
+
+            self.halfmoveClockLog.pop()
+            self.halfmoveClock = self.halfmoveClockLog[-1]
+            if move.pieceMoved[0] == 'b':
+                self.fullmoveNumber -= 1
 
             self.checkMate = False
             self.staleMate = False
 
+    def makeNullMove(self):
+        """
+        passes the turn without moving, for null move pruning. None is logged as the move, so undoNullMove
+        (not undoMove) has to take it back. not allowed in check, side to move's king would be left attacked
+        """
+        self.moveLog.append(None)
+        if self.enpassantPossible != ():
+            self.zobristKey ^= ZOBRIST_ENPASSANT[self.enpassantPossible[1]]
+            self.enpassantPossible = ()
+        self.zobristKey ^= ZOBRIST_BLACK_TO_MOVE
+        if not self.whiteToMove:
+            self.fullmoveNumber += 1
+        self.whiteToMove = not self.whiteToMove
+        self.enpassantLog.append(self.enpassantPossible)
+        self.zobristLog.append(self.zobristKey)
+        self.halfmoveClock += 1
+        self.halfmoveClockLog.append(self.halfmoveClock)
+
+    def undoNullMove(self):
+        self.moveLog.pop()
+        self.whiteToMove = not self.whiteToMove
+        if not self.whiteToMove:
+            self.fullmoveNumber -= 1
+        self.enpassantLog.pop()
+        self.enpassantPossible = self.enpassantLog[-1]
+        self.zobristLog.pop()
+        self.zobristKey = self.zobristLog[-1]
+        self.halfmoveClockLog.pop()
+        self.halfmoveClock = self.halfmoveClockLog[-1]
+
+    def hasNonPawnMaterial(self):
+        # whether side to move has a piece besides king & pawns, without one passing may be its best option
+        color = 'w' if self.whiteToMove else 'b'
+        return any(piece[0] == color and piece[1] in 'NBRQ' for piece in self.board.flat)
+
     def updateCastleRights(self, move):
         if move.pieceMoved == 'wK':  # check if king was moved to remove all castling rights
             self.currentCastlingRight.wks = False
@@ -151,15 +444,15 @@ class GameState:
 
         elif move.pieceMoved == 'wR':  # if rook was moved, which side castling is not possible
             if move.startRow == 7:
-                if move.endRow == 0:  # left rook
+                if move.startCol == 0:  # left rook
                     self.currentCastlingRight.wqs = False
-                if move.endRow == 7:  # right rook
+                elif move.startCol == 7:  # right rook
                     self.currentCastlingRight.wks = False
         elif move.pieceMoved == 'bR':
             if move.startRow == 0:
-                if move.endRow == 0:  # left rook
+                if move.startCol == 0:  # left rook
                     self.currentCastlingRight.bqs = False
-                if move.endRow == 7:  # right rook
+                elif move.startCol == 7:  # right rook
                     self.currentCastlingRight.bks = False
 
         # if rook is captured
@@ -173,66 +466,50 @@ class GameState:
         if move.pieceCaptured == 'bR':
             if move.endRow == 0:
                 if move.endCol == 0:
-                    self.currentCastlingRight.wqs = False
+                    self.currentCastlingRight.bqs = False
                 elif move.endCol == 7:
-                    self.currentCastlingRight.wks = False
+                    self.currentCastlingRight.bks = False
 
     def getValidMoves(self):
-        # all moves considering checks, i.e.to check if the piece movement gets king a check.
-
-        moves = self.getAllPossibleMoves()
-
-        tempCastleRights = CastleRights(self.currentCastlingRight.wks, self.currentCastlingRight.wqs,
-                                        self.currentCastlingRight.bks,
-                                        self.currentCastlingRight.bqs)
-
+        """
+        all moves considering checks, generated in one pass.
+        pins, checks & squares the enemy attacks are found once up front, so each piece generator only
+        produces moves that are already legal & the king never has to be moved around to test a square
+        """
         self.inCheck, self.pins, self.checks = self.checkForPinsAndChecks()
+        self.pinDirections = {(pin[0], pin[1]): (pin[2], pin[3]) for pin in self.pins}
+        self.enemyAttacks = self.getEnemyAttacks()
 
         # setting up  king's location to evaluate moves
         if self.whiteToMove:
-            kingRow = self.whiteKingLocation[0]
-            kingCol = self.whiteKingLocation[1]
+            kingRow, kingCol = self.whiteKingLocation
+        else:
+            kingRow, kingCol = self.blackKingLocation
+
+        if len(self.checks) > 1:
+            # double check, king has to move
+            moves = []
+            self.getKingMoves(kingRow, kingCol, moves)
         else:
-            kingRow = self.blackKingLocation[0]
-            kingCol = self.blackKingLocation[1]
-
-        if self.inCheck:
-            # if king is in check
-            if len(self.checks) == 1:  # only 1 piece is giving the checks,i.e. block check or move king
-                moves = self.getAllPossibleMoves()
-                # to block check, piece must be moved between king and attacking piece
-                check = self.checks[0]
-                checkRow = check[0]
-                checkCol = check[1]
-                pieceChecking = self.board[checkRow, checkCol]  # finding piece checking the king
-                validSquares = []
-
-                # if knight gives a check, capture the knight or move the king, rest pieces' checks can be blocked
-                if pieceChecking[1] == "N":
-                    validSquares = [(checkRow, checkCol)]
+            moves = self.getAllPossibleMoves()
+            if self.inCheck:
+                # only 1 piece is giving the check, i.e. block check, capture the piece or move king
+                checkRow, checkCol, checkDirRow, checkDirCol = self.checks[0]
+                if self.board[checkRow, checkCol][1] == 'N':
+                    # if knight gives a check, capture the knight or move the king, rest pieces' checks can be blocked
+                    validSquares = {(checkRow, checkCol)}
                 else:
+                    validSquares = set()
                     for i in range(1, 8):
-                        validSquare = (kingRow + check[2] * i, kingCol + check[3] * i)
-                        # direction of attacking piece to block check
-                        validSquares.append(validSquare)
-                        if validSquare[0] == checkRow and validSquare[1] == checkCol:
-                            # once you get to piece & checks
+                        # direction of attacking piece to block check, up to & including the piece
+                        validSquares.add((kingRow + checkDirRow * i, kingCol + checkDirCol * i))
+                        if (kingRow + checkDirRow * i, kingCol + checkDirCol * i) == (checkRow, checkCol):
                             break
+                # king moves are already safe, rest must block or capture (en-passant captures off the check line)
+                moves = [move for move in moves if move.pieceMoved[1] == 'K' or
+                         (move.endRow, move.endCol) in validSquares or
+                         (move.isEnpassantMove and (move.startRow, move.endCol) == (checkRow, checkCol))]
 
-                # get rid of all moves that don't move king or block check
-                for i in range(len(moves) - 1, -1, -1):  # going backwards while deleting from list
-                    if moves[i].pieceMoved[1] != 'K':
-                        # if piece moved wasn't king, check must be blocked, or piece must be captured
-                        if not (moves[i].endRow, moves[i].endCol) in validSquares:
-                            # if move doesn't stop check, remove it from list
-                            moves.remove(moves[i])
-
-            else:
-                # double check, king has to move
-                self.getKingMoves(kingRow, kingCol, moves)
-        else:
-            # if king isn't in check, then all moves are valid
-            moves = self.getAllPossibleMoves()
         if len(moves) == 0:
             if self.inCheck:
                 self.checkMate = True
@@ -241,9 +518,186 @@ class GameState:
         else:
             self.checkMate = False
             self.staleMate = False
-        self.currentCastlingRight = tempCastleRights
         return moves
 
+    def getEnemyAttacks(self):
+        """
+        set of (row, col) squares attacked by the side not to move.
+        king of the side to move is lifted off the board first, so squares behind it on a checking line
+        count as attacked & the king can't step back along the check
+        """
+        enemyColor = 'b' if self.whiteToMove else 'w'
+        kingRow, kingCol = self.whiteKingLocation if self.whiteToMove else self.blackKingLocation
+        king = self.board[kingRow, kingCol]
+        self.board[kingRow, kingCol] = '--'
+
+        attacked = set()
+        pawnDirection = 1 if enemyColor == 'b' else -1
+        for r in range(DIMENSION):
+            for c in range(DIMENSION):
+                piece = self.board[r, c]
+                if piece[0] != enemyColor:
+                    continue
+                pieceType = piece[1]
+                if pieceType == 'p':
+                    for endCol in (c - 1, c + 1):
+                        if 0 <= endCol < 8 and 0 <= r + pawnDirection < 8:
+                            attacked.add((r + pawnDirection, endCol))
+                elif pieceType == 'N' or pieceType == 'K':
+                    for d in (KNIGHT_DIRECTIONS if pieceType == 'N' else KING_DIRECTIONS):
+                        endRow, endCol = r + d[0], c + d[1]
+                        if 0 <= endRow < 8 and 0 <= endCol < 8:
+                            attacked.add((endRow, endCol))
+                else:
+                    directions = ROOK_DIRECTIONS if pieceType == 'R' else BISHOP_DIRECTIONS if pieceType == 'B' \
+                        else KING_DIRECTIONS
+                    for d in directions:
+                        # slide until first piece, the piece's own square is attacked too
+                        endRow, endCol = r + d[0], c + d[1]
+                        while 0 <= endRow < 8 and 0 <= endCol < 8:
+                            attacked.add((endRow, endCol))
+                            if self.board[endRow, endCol] != '--':
+                                break
+                            endRow, endCol = endRow + d[0], endCol + d[1]
+
+        self.board[kingRow, kingCol] = king
+        return attacked
+
+    def getPseudoLegalMoves(self, stage=ALL_MOVES):
+        """
+        moves that follow piece movement rules but may leave own king in check, for search to confirm with tryMove.
+        stage picks captures & promotions (CAPTURE_MOVES), the rest (QUIET_MOVES) or both (ALL_MOVES)
+        """
+        moves = []
+        if stage & CAPTURE_MOVES:
+            moves += self.getPseudoLegalCaptures()
+        if stage & QUIET_MOVES:
+            moves += self.getPseudoLegalQuietMoves()
+        return moves
+
+    def getPseudoLegalCaptures(self):
+        # scans for captures & promotions directly, quiet moves are never built
+        moves = []
+        allyColor, enemyColor = ('w', 'b') if self.whiteToMove else ('b', 'w')
+        moveAmount, backRow = (-1, 0) if self.whiteToMove else (1, 7)
+        for r in range(DIMENSION):
+            for c in range(DIMENSION):
+                piece = self.board[r, c]
+                if piece[0] != allyColor:
+                    continue
+                pieceType = piece[1]
+                if pieceType == 'p':
+                    endRow = r + moveAmount
+                    if endRow == backRow and self.board[endRow, c] == '--':
+                        addPawnMove(moves, (r, c), (endRow, c), self.board, True)
+                    for endCol in (c - 1, c + 1):
+                        if 0 <= endCol < 8:
+                            if self.board[endRow, endCol][0] == enemyColor:
+                                addPawnMove(moves, (r, c), (endRow, endCol), self.board, endRow == backRow)
+                            elif (endRow, endCol) == self.enpassantPossible:
+                                moves.append(Move((r, c), (endRow, endCol), self.board, isEnpassantMove=True))
+                elif pieceType == 'N' or pieceType == 'K':
+                    for d in (KNIGHT_DIRECTIONS if pieceType == 'N' else KING_DIRECTIONS):
+                        endRow, endCol = r + d[0], c + d[1]
+                        if 0 <= endRow < 8 and 0 <= endCol < 8 and self.board[endRow, endCol][0] == enemyColor:
+                            moves.append(Move((r, c), (endRow, endCol), self.board))
+                else:
+                    directions = ROOK_DIRECTIONS if pieceType == 'R' else BISHOP_DIRECTIONS if pieceType == 'B' \
+                        else KING_DIRECTIONS
+                    for d in directions:
+                        # slide until first piece, only an enemy piece there makes a capture
+                        endRow, endCol = r + d[0], c + d[1]
+                        while 0 <= endRow < 8 and 0 <= endCol < 8:
+                            endPiece = self.board[endRow, endCol]
+                            if endPiece != '--':
+                                if endPiece[0] == enemyColor:
+                                    moves.append(Move((r, c), (endRow, endCol), self.board))
+                                break
+                            endRow, endCol = endRow + d[0], endCol + d[1]
+        return moves
+
+    def getPseudoLegalQuietMoves(self):
+        # scans for moves to empty squares other than promotions, captures are never built
+        moves = []
+        allyColor = 'w' if self.whiteToMove else 'b'
+        moveAmount, startRow, backRow = (-1, 6, 0) if self.whiteToMove else (1, 1, 7)
+        for r in range(DIMENSION):
+            for c in range(DIMENSION):
+                piece = self.board[r, c]
+                if piece[0] != allyColor:
+                    continue
+                pieceType = piece[1]
+                if pieceType == 'p':
+                    endRow = r + moveAmount
+                    if endRow != backRow and self.board[endRow, c] == '--':
+                        moves.append(Move((r, c), (endRow, c), self.board))
+                        if r == startRow and self.board[endRow + moveAmount, c] == '--':
+                            moves.append(Move((r, c), (endRow + moveAmount, c), self.board))
+                elif pieceType == 'N' or pieceType == 'K':
+                    for d in (KNIGHT_DIRECTIONS if pieceType == 'N' else KING_DIRECTIONS):
+                        endRow, endCol = r + d[0], c + d[1]
+                        if 0 <= endRow < 8 and 0 <= endCol < 8 and self.board[endRow, endCol] == '--':
+                            moves.append(Move((r, c), (endRow, endCol), self.board))
+                    if pieceType == 'K':
+                        # path squares are checked for attacks by tryMove
+                        self.getCastleMoves(r, c, moves, allyColor, set())
+                else:
+                    directions = ROOK_DIRECTIONS if pieceType == 'R' else BISHOP_DIRECTIONS if pieceType == 'B' \
+                        else KING_DIRECTIONS
+                    for d in directions:
+                        # slide over empty squares, stopping at the first piece
+                        endRow, endCol = r + d[0], c + d[1]
+                        while 0 <= endRow < 8 and 0 <= endCol < 8 and self.board[endRow, endCol] == '--':
+                            moves.append(Move((r, c), (endRow, endCol), self.board))
+                            endRow, endCol = endRow + d[0], endCol + d[1]
+        return moves
+
+    def squareAttacked(self, r, c, attackerColor):
+        # whether any piece of attackerColor attacks the square, looking outwards from it
+        pawnRow = r + 1 if attackerColor == 'w' else r - 1  # white pawns attack towards row 0
+        if 0 <= pawnRow < 8:
+            for pawnCol in (c - 1, c + 1):
+                if 0 <= pawnCol < 8 and self.board[pawnRow, pawnCol] == attackerColor + 'p':
+                    return True
+        for directions, piece in ((KNIGHT_DIRECTIONS, 'N'), (KING_DIRECTIONS, 'K')):
+            for d in directions:
+                endRow, endCol = r + d[0], c + d[1]
+                if 0 <= endRow < 8 and 0 <= endCol < 8 and self.board[endRow, endCol] == attackerColor + piece:
+                    return True
+        for directions, slider in ((ROOK_DIRECTIONS, 'R'), (BISHOP_DIRECTIONS, 'B')):
+            for d in directions:
+                endRow, endCol = r + d[0], c + d[1]
+                while 0 <= endRow < 8 and 0 <= endCol < 8:
+                    endPiece = self.board[endRow, endCol]
+                    if endPiece != '--':
+                        if endPiece[0] == attackerColor and (endPiece[1] == slider or endPiece[1] == 'Q'):
+                            return True
+                        break
+                    endRow, endCol = endRow + d[0], endCol + d[1]
+        return False
+
+    def tryMove(self, move):
+        """
+        makes a pseudo-legal move & returns True if it's legal.
+        if it leaves the mover's king in check it's taken back & False is returned
+        """
+        enemyColor = 'b' if self.whiteToMove else 'w'
+        if move.isCastleMove:
+            # can't castle out of check or through an attacked square, landing square is tested below
+            if self.squareAttacked(move.startRow, move.startCol, enemyColor) or \
+                    self.squareAttacked(move.startRow, (move.startCol + move.endCol) // 2, enemyColor):
+                return False
+        self.makeMove(move)
+        kingRow, kingCol = self.blackKingLocation if enemyColor == 'w' else self.whiteKingLocation
+        if self.squareAttacked(kingRow, kingCol, enemyColor):
+            self.undoMove()
+            return False
+        return True
+
+    def isInCheck(self):
+        # whether the player to move is in check, without generating any moves
+        return self.checkForPinsAndChecks()[0]
+
     def getAllPossibleMoves(self):
         # Get piece's all possible moves
         moves = []  # stores all possible moves
@@ -259,16 +713,8 @@ class GameState:
     def getPawnMoves(self, r, c, moves):
         # gets all possible pawn moves and append it to moves
 
-        piecePinned = False
-        pinDirection = ()
-
-        for i in range(len(self.pins) - 1, -1, -1):  # iterating through pins in reverse order
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                # checking if current piece is pinned
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
+        pinDirection = self.pinDirections.get((r, c))  # checking if current piece is pinned
+        piecePinned = pinDirection is not None
 
         if self.whiteToMove:
             moveAmount = -1
@@ -286,10 +732,11 @@ class GameState:
         pawnPromotion = False
 
         if self.board[r + moveAmount, c] == '--':  # 1 square pawn advance
-            if not piecePinned or pinDirection == (moveAmount, 0):
+            if not piecePinned or pinDirection == (moveAmount, 0) or pinDirection == (-moveAmount, 0):
+                # pinned along the file, pawn can still push towards or away from the king
                 if r + moveAmount == backRow:  # if piece gets to back rank, it's a promotion
                     pawnPromotion = True
-                moves.append(Move((r, c), (r + moveAmount, c), self.board, pawnPromotion=pawnPromotion))
+                addPawnMove(moves, (r, c), (r + moveAmount, c), self.board, pawnPromotion)
                 if r == startRow and self.board[r + 2 * moveAmount, c] == "--":  # 2 square pawn advance
                     moves.append(Move((r, c), (r + 2 * moveAmount, c), self.board))
 
@@ -298,7 +745,7 @@ class GameState:
                 if self.board[r + moveAmount, c - 1][0] == enemyColor:  # enemy's piece to capture
                     if r + moveAmount == backRow:  # if piece gets to back rank, it's a promotion
                         pawnPromotion = True
-                    moves.append(Move((r, c), (r + moveAmount, c - 1), self.board, pawnPromotion=pawnPromotion))
+                    addPawnMove(moves, (r, c), (r + moveAmount, c - 1), self.board, pawnPromotion)
                 if (r + moveAmount, c - 1) == self.enpassantPossible:
                     blockingPiece = attackingPiece = False
                     if kingRow == r:
@@ -317,8 +764,10 @@ class GameState:
                             square = self.board[r, i]
                             if square[0] == enemyColor and (square[1] == 'R' or square[1] == 'Q'):  # attacking piece
                                 attackingPiece = True
+                                break
                             elif square != '--':
-                                blockingPiece = True
+                                # only first piece beyond the pawns matters
+                                break
                     if not attackingPiece or blockingPiece:
                         moves.append(Move((r, c), (r + moveAmount, c - 1), self.board, isEnpassantMove=True))
 
@@ -327,7 +776,7 @@ class GameState:
                 if self.board[r + moveAmount, c + 1][0] == enemyColor:  # enemy's piece to capture
                     if r + moveAmount == backRow:
                         pawnPromotion = True
-                    moves.append(Move((r, c), (r + moveAmount, c + 1), self.board, pawnPromotion=pawnPromotion))
+                    addPawnMove(moves, (r, c), (r + moveAmount, c + 1), self.board, pawnPromotion)
                 if (r + moveAmount, c + 1) == self.enpassantPossible:
                     blockingPiece = attackingPiece = False
                     if kingRow == r:
@@ -346,27 +795,18 @@ class GameState:
                             square = self.board[r, i]
                             if square[0] == enemyColor and (square[1] == 'R' or square[1] == 'Q'):  # attacking piece
                                 attackingPiece = True
+                                break
                             elif square != '--':
-                                blockingPiece = True
+                                # only first piece beyond the pawns matters
+                                break
                     if not attackingPiece or blockingPiece:
                         moves.append(Move((r, c), (r + moveAmount, c + 1), self.board, isEnpassantMove=True))
 
     def getRookMoves(self, r, c, moves):
         # gets all possible rook moves and append to moves variable
 
-        piecePinned = False
-        pinDirection = ()
-
-        for i in range(len(self.pins) - 1, -1, -1):  # iterating through pins in reverse order
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                # checking if current piece is pinned
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                if self.board[r][c][1] != 'Q':
-                    # we use 2 function for finding valid moves for queen
-                    # can't pin queen from pin on rook moves,only remove it on bishop moves
-                    self.pins.remove(self.pins[i])
-                break
+        pinDirection = self.pinDirections.get((r, c))  # checking if current piece is pinned
+        piecePinned = pinDirection is not None
 
         directions = ((-1, 0), (0, -1), (1, 0), (0, 1))  # possible directions of rook move (up,left, down, right)
 
@@ -398,16 +838,8 @@ class GameState:
     def getBishopMoves(self, r, c, moves):
         # gets all possible bishop moves and append to moves variable
 
-        piecePinned = False
-        pinDirection = ()
-
-        for i in range(len(self.pins) - 1, -1, -1):  # iterating through pins in reverse order
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                # checking if current piece is pinned
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
+        pinDirection = self.pinDirections.get((r, c))  # checking if current piece is pinned
+        piecePinned = pinDirection is not None
 
         directions = ((-1, -1), (1, -1), (1, 1), (-1, 1))  # possible directions of bishop move (all diagonals)
 
@@ -438,14 +870,7 @@ class GameState:
     def getKnightMoves(self, r, c, moves):
         # gets all possible knight moves and append to moves variable
 
-        piecePinned = False
-
-        for i in range(len(self.pins) - 1, -1, -1):  # iterating through pins in reverse order
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                # checking if current piece is pinned
-                piecePinned = True
-                self.pins.remove(self.pins[i])
-                break
+        piecePinned = (r, c) in self.pinDirections  # a pinned knight can never move
 
         knightMoves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1),
                        (2, 1))  # possible directions of knight move (L-shaped)
@@ -472,35 +897,15 @@ class GameState:
     def getKingMoves(self, r, c, moves):
         # gets all possible king moves and append to moves variable
 
-        kingMoves = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
-        # all possible king movement directions
-
         allyColor = 'w' if self.whiteToMove else 'b'  # sets ally color
-        for i in range(8):  # total king movement possibilities
-            endRow = r + kingMoves[i][0]
-            endCol = c + kingMoves[i][1]
+        for d in KING_DIRECTIONS:  # all possible king movement directions
+            endRow = r + d[0]
+            endCol = c + d[1]
             if 0 <= endRow < 8 and 0 <= endCol < 8:  # piece is on the board , even after moving
-                endPiece = self.board[endRow, endCol]  # fetching the piece on potential king move
-                if endPiece[0] != allyColor:
-                    # piece isn't an ally ( i.e. space is empty or an enemy piece )
-
-                    # places king on end square to check for checks
-                    if allyColor == 'w':
-                        self.whiteKingLocation = (endRow, endCol)
-                    else:
-                        self.blackKingLocation = (endRow, endCol)
-
-                    inCheck, pins, checks = self.checkForPinsAndChecks()
-
-                    if not inCheck:
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
-
-                    # placing king on original square
-                    if allyColor == 'w':
-                        self.whiteKingLocation = (r, c)
-                    else:
-                        self.blackKingLocation = (r, c)
-            self.getCastleMoves(r, c, moves, allyColor)
+                # square must hold no ally ( i.e. space is empty or an enemy piece ) & not be attacked
+                if self.board[endRow, endCol][0] != allyColor and (endRow, endCol) not in self.enemyAttacks:
+                    moves.append(Move((r, c), (endRow, endCol), self.board))
+        self.getCastleMoves(r, c, moves, allyColor, self.enemyAttacks)
 
     def checkForPinsAndChecks(self):
         pins = []  # pinned pieces to the king
@@ -582,79 +987,63 @@ class GameState:
                     checks.append((endRow, endCol, m[0], m[1]))
         return inCheck, pins, checks
 
-    def getCastleMoves(self, r, c, moves, allyColor):
-        # gets all possible castle moves, & add item to moves list
+    def getCastleMoves(self, r, c, moves, allyColor, attacked):
+        # gets all possible castle moves, & add item to moves list. attacked are the squares the king can't cross
 
-        if self.inCheck:
+        if (r, c) in attacked:
             # can't castle if king is in check
             return
         if (self.whiteToMove and self.currentCastlingRight.wks) or (
                 not self.whiteToMove and self.currentCastlingRight.bks):
             # white/black king has king castling rights
-            self.kingSideCastleMoves(r, c, moves, allyColor)
+            self.kingSideCastleMoves(r, c, moves, allyColor, attacked)
         if (self.whiteToMove and self.currentCastlingRight.wqs) or (
                 not self.whiteToMove and self.currentCastlingRight.bqs):
             # white/black king has queen castling rights
-            self.queenSideCastleMoves(r, c, moves, allyColor)
-
-    def kingSideCastleMoves(self, r, c, moves, allyColor):
-        if self.board[r, c + 1] == '--' and self.board[r, c + 2] == '--':
-            # both squares empty
-            # places king on end square to check for checks
-            if allyColor == 'w':
-                self.whiteKingLocation = (r, c + 1)
-            else:
-                self.blackKingLocation = (r, c + 1)
-            inCheck1, pins1, checks1 = self.checkForPinsAndChecks()
-            if allyColor == 'w':
-                self.whiteKingLocation = (r, c + 2)
-            else:
-                self.blackKingLocation = (r, c + 2)
-            inCheck2, pins2, checks2 = self.checkForPinsAndChecks()
-            if not inCheck1 and not inCheck2:
-                moves.append(Move((r, c), (r, c + 2), self.board, isCastleMove=True))
-
-            if allyColor == 'w':
-                # setting up king's location to its original one
-                self.whiteKingLocation = (r, c)
-            else:
-                self.blackKingLocation = (r, c)
-
-    def queenSideCastleMoves(self, r, c, moves, allyColor):
-        if self.board[r, c - 1] == '--' and self.board[r, c - 2] == '--' and self.board[r, c - 3] == '--':
-            # both squares empty
-            # places king on end square to check for checks
-            if allyColor == 'w':
-                self.whiteKingLocation = (r, c - 1)
-            else:
-                self.blackKingLocation = (r, c - 1)
-            inCheck1, pins1, checks1 = self.checkForPinsAndChecks()
+            self.queenSideCastleMoves(r, c, moves, allyColor, attacked)
 
-            if allyColor == 'w':
-                self.whiteKingLocation = (r, c - 2)
-            else:
-                self.blackKingLocation = (r, c - 2)
-            inCheck2, pins2, checks2 = self.checkForPinsAndChecks()
+    def kingSideCastleMoves(self, r, c, moves, allyColor, attacked):
+        # both squares empty & not attacked, rook still on its square
+        if self.board[r, c + 1] == '--' and self.board[r, c + 2] == '--' and self.board[r, c + 3] == allyColor + 'R':
+            if (r, c + 1) not in attacked and (r, c + 2) not in attacked:
+                moves.append(Move((r, c), (r, c + 2), self.board, isCastleMove=True))
 
-            if not inCheck1 and not inCheck2:
+    def queenSideCastleMoves(self, r, c, moves, allyColor, attacked):
+        # 3 squares empty, the 2 king crosses not attacked, rook still on its square
+        if self.board[r, c - 1] == '--' and self.board[r, c - 2] == '--' and self.board[r, c - 3] == '--' and \
+                self.board[r, c - 4] == allyColor + 'R':
+            if (r, c - 1) not in attacked and (r, c - 2) not in attacked:
                 moves.append(Move((r, c), (r, c - 2), self.board, isCastleMove=True))
 
-            if allyColor == 'w':
-                # setting up king's location to its original one
-                self.whiteKingLocation = (r, c)
-            else:
-                self.blackKingLocation = (r, c)
+
+def addPawnMove(moves, startSq, endSq, board, pawnPromotion):
+    # pawn reaching the back rank gives one move per piece it can promote to
+    if pawnPromotion:
+        for piece in PROMOTION_PIECES:
+            moves.append(Move(startSq, endSq, board, pawnPromotion=True, promotionPiece=piece))
+    else:
+        moves.append(Move(startSq, endSq, board))
 
 
 class CastleRights:
+    __slots__ = ('wks', 'wqs', 'bks', 'bqs')
+
     def __init__(self, wks, wqs, bks, bqs):
         self.wks = wks
         self.wqs = wqs
         self.bks = bks
         self.bqs = bqs
 
+    def index(self):
+        # packs the 4 rights into a number from 0 to 15
+        return self.wks | self.wqs << 1 | self.bks << 2 | self.bqs << 3
+
 
 class Move:
+    # thousands of moves are made per search, slots keep them small (no per-instance __dict__) & quick to create
+    __slots__ = ('startRow', 'startCol', 'endRow', 'endCol', 'moveID', 'pieceMoved', 'pieceCaptured',
+                 'pawnPromotion', 'promotionPiece', 'isEnpassantMove', 'isCastleMove', 'isCapture')
+
     # mapping ranks to their respective rows
     ranksToRows = {'1': 7, '2': 6, '3': 5, '4': 4, '5': 3, '6': 2, '7': 1, '8': 0}
     # mapping  rows in board to their respective ranks
@@ -665,7 +1054,11 @@ class Move:
     # mapping column  to their respective files
     colsToFiles = {v: k for k, v in filesToCols.items()}
 
-    def __init__(self, startSq, endSq, board, pawnPromotion=False, isEnpassantMove=False, isCastleMove=False):
+    # added to moveID of promotions, so each promotion piece gives a different move (queen keeps plain ID)
+    promotionIDs = {'Q': 0, 'R': 10000, 'B': 20000, 'N': 30000}
+
+    def __init__(self, startSq, endSq, board, pawnPromotion=False, isEnpassantMove=False, isCastleMove=False,
+                 promotionPiece='Q'):
         # extracting starting and end position of piece to be moved
         self.startRow = startSq[0]
         self.startCol = startSq[1]
@@ -681,6 +1074,9 @@ class Move:
 
         # information about pawn promotion
         self.pawnPromotion = pawnPromotion
+        self.promotionPiece = promotionPiece  # piece type pawn turns into, only used if pawnPromotion is set
+        if pawnPromotion:
+            self.moveID += self.promotionIDs[promotionPiece]
 
         # Enpassant
         self.isEnpassantMove = isEnpassantMove
@@ -699,6 +1095,10 @@ class Move:
             return self.moveID == other.moveID
         return False
 
+    def __hash__(self):
+        # equal moves share moveID, so they hash alike & moves can be kept in sets or used as dict keys
+        return self.moveID
+
     def __str__(self):
         # overriding the str() function
 
@@ -709,10 +1109,11 @@ class Move:
 
         # pawn move
         if self.pieceMoved[1] == 'p':
+            promotion = "=" + self.promotionPiece if self.pawnPromotion else ""
             if self.isCapture:
-                return self.colsToFiles[self.startCol] + "x" + endSquare
+                return self.colsToFiles[self.startCol] + "x" + endSquare + promotion
             else:
-                return endSquare
+                return endSquare + promotion
 
         moveString = self.pieceMoved[1]
         if self.isCapture:
@@ -720,8 +1121,11 @@ class Move:
         return moveString + endSquare
 
     def getChessNotation(self):
-        # returns chess notation for particular move
-        return self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+        # returns chess notation for particular move, promotions end with the piece, eg e7e8q
+        notation = self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+        if self.pawnPromotion:
+            notation += self.promotionPiece.lower()
+        return notation
 
     def getRankFile(self, row, col):
         # returns rank/file using row and columns
@@ -2,10 +2,15 @@
 main driver file.
 Responsible for handling user input and displaying current gamestate
 """
+import copy
+import queue
+import threading
 import time
+import traceback
 
 import pygame as p
 import ChessEngine
+import BitboardEngine
 import BestMoveFinder
 import tkinter as tk
 from tkinter import messagebox
@@ -22,6 +27,11 @@ MAX_FPS = 30
 playerOne = False
 playerTwo = False
 
+# bitboard engine generates the same moves as ChessEngine, only faster. set False to use the array based one
+USE_BITBOARD_ENGINE = True
+
+AI_TIME_LIMIT = 3  # seconds the AI may think per move, it searches deeper while time is left
+
 # initialize global directory of images .This will be called exactly once in the main
 IMAGES = {}
 
@@ -35,6 +45,33 @@ def loadImages():
         # images can be accessed by IMAGES['wK']
 
 
+def newGameState():
+    # creates game state at starting position, using engine selected above
+    if USE_BITBOARD_ENGINE:
+        return BitboardEngine.GameState()
+    return ChessEngine.GameState()
+
+
+def findAIMove(engine, gs, validMoves, returnQueue, stopEvent):
+    # runs in a worker thread on a copy of game state, so window keeps handling events while AI thinks
+    try:
+        AIMove = engine.findBestMove(gs, validMoves, stop=stopEvent)
+    except Exception:
+        # a failed search still has to hand back a move, or the window would wait for it forever
+        traceback.print_exc()
+        AIMove = None
+    if AIMove is None and not stopEvent.is_set():
+        AIMove = BestMoveFinder.findRandomMove(validMoves)
+    returnQueue.put(AIMove)
+
+
+def stopAI(moveFinderThread, stopEvent):
+    # cancels search in progress & waits for it, it stops within a few nodes
+    if moveFinderThread is not None:
+        stopEvent.set()
+        moveFinderThread.join()
+
+
 def main():
     # main driver function , handles inputs and graphics update
     screen = p.display.set_mode((BOARD_WIDTH + MOVE_LOG_PANEL_WIDTH, BOARD_HEIGHT))  # set up the screen
@@ -46,7 +83,7 @@ def main():
     global playerOne
     global playerTwo
 
-    gs = ChessEngine.GameState()
+    gs = newGameState()
     validMoves = gs.getValidMoves()  # gets valid move for current state
     moveMade = False  # flag variable to check if move is made for update of valid moves
     animate = False  # flag variable to check when to animate piece movement
@@ -54,6 +91,12 @@ def main():
     loadImages()
     sqSelected = ()  # stores  last click of user as tuple (x,y)
     playerClicks = []  # keeps track of player clicks ( 2 Tuples : ex, (6,4)->(4,4))
+    moveFinderThread = None  # worker searching for AI's move, None while AI isn't thinking
+    stopEvent = threading.Event()  # set to cancel the worker's search
+    returnQueue = queue.Queue()  # worker puts the move it found here
+    # keeps its tables from move to move
+    engine = BestMoveFinder.SearchEngine(timeLimit=AI_TIME_LIMIT, book=BestMoveFinder.BOOK_FILE,
+                                         tablebase=BestMoveFinder.TABLEBASE_DIR)
 
     mode_selection = True
     selected_mode = None
@@ -102,6 +145,7 @@ def main():
 
         for e in p.event.get():
             if e.type == p.QUIT:  # exits the game
+                stopAI(moveFinderThread, stopEvent)
                 running = False
                 break
             elif e.type == p.MOUSEBUTTONDOWN:
@@ -138,13 +182,18 @@ def main():
             elif e.type == p.KEYDOWN:
                 if e.key == p.K_z:
                     # if key entered is "z", undo moves
+                    stopAI(moveFinderThread, stopEvent)
+                    moveFinderThread = None
                     gs.undoMove()
+                    validMoves = gs.getValidMoves()
                     animate = False
                     moveMade = True
 
                 if e.key == p.K_r:
                     # if key entered is "r", undo moves
-                    gs = ChessEngine.GameState()
+                    stopAI(moveFinderThread, stopEvent)
+                    moveFinderThread = None
+                    gs = newGameState()
                     validMoves = gs.getValidMoves()
                     sqSelected = ()
                     playerClicks = []
@@ -153,7 +202,7 @@ def main():
 
         if gameOver:  # if game is over, restart
             time.sleep(2)
-            gs = ChessEngine.GameState()
+            gs = newGameState()
             validMoves = gs.getValidMoves()
             sqSelected = ()
             playerClicks = []
@@ -161,14 +210,23 @@ def main():
             animate = False
             gameOver = False
         # AI move finder
-
-        if not humanTurn:
-            AIMove = BestMoveFinder.findBestMove(gs, validMoves)
-            if AIMove is None:
-                AIMove = BestMoveFinder.findRandomMove(validMoves)
-            gs.makeMove(AIMove)
-            moveMade = True
-            animate = True
+        # undo & reset above may have changed whose turn it is, so it's worked out again for the current position
+        humanTurn = (gs.whiteToMove and playerOne) or (not gs.whiteToMove and playerTwo)
+        if not humanTurn and running:
+            if moveFinderThread is None:
+                # search runs on copies, the board on screen is never touched by the worker
+                stopEvent = threading.Event()
+                returnQueue = queue.Queue()
+                moveFinderThread = threading.Thread(target=findAIMove, daemon=True,
+                                                    args=(engine, copy.deepcopy(gs), list(validMoves), returnQueue,
+                                                          stopEvent))
+                moveFinderThread.start()
+            elif not returnQueue.empty():
+                AIMove = returnQueue.get()
+                moveFinderThread = None
+                gs.makeMove(AIMove)
+                moveMade = True
+                animate = True
 
         if moveMade:
             if animate:
@@ -177,6 +235,8 @@ def main():
             moveMade = False
 
         drawGameState(screen, gs, validMoves, sqSelected, moveLogFont)  # draw the board
+        if moveFinderThread is not None:
+            drawThinking(screen, moveLogFont)
         clock.tick(MAX_FPS)
         p.display.flip()
 
@@ -338,6 +398,13 @@ def animateMove(move, screen, board, clock):
         clock.tick(60)
 
 
+def drawThinking(screen, font):
+    # "thinking" indicator at the bottom of move log panel, dots cycle while AI searches
+    dots = '.' * (p.time.get_ticks() // 400 % 4)
+    textObject = font.render("AI is thinking" + dots, True, p.Color('Gray'))
+    screen.blit(textObject, (BOARD_WIDTH + 5, MOVE_LOG_PANEL_HEIGHT - textObject.get_height() - 5))
+
+
 def drawText(screen, text):
     font = p.font.Font(None, 36)
     textObject = font.render(text, False, p.Color('Gray'))
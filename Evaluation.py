@@ -0,0 +1,211 @@
+"""
+Static evaluation tables.
+Responsible for :
+-holding material values & piece-square tables, combined once into a flat table per piece indexed by square
+-evaluating a board with table lookups only, nothing is allocated per call
+-loading other tables from a file while the program runs
+-scoring many positions at once with NumPy, for offline analysis & evaluating all children of a node
+"""
+
+import json
+
+import numpy as np
+
+PIECE_VALUES = {'p': 1, 'N': 3, 'B': 3, 'R': 5, 'Q': 9, 'K': 0}  # material, in pawns
+MATERIAL_WEIGHT = 100
+PIECE_SQUARE_WEIGHT = 5
+
+# bonus for a piece standing on a square, from white's side of the board (row 0 is black's back rank)
+PIECE_SQUARE_TABLES = {
+    'p': [
+        [8, 8, 8, 8, 8, 8, 8, 8],
+        [8, 8, 8, 8, 8, 8, 8, 8],
+        [5, 6, 6, 7, 7, 6, 6, 5],
+        [2, 2, 3, 5, 5, 3, 2, 2],
+        [1, 2, 3, 4, 4, 3, 2, 1],
+        [1, 2, 3, 3, 3, 3, 2, 1],
+        [1, 1, 1, 0, 0, 1, 1, 1],
+        [0, 0, 0, 0, 0, 0, 0, 0]
+    ],
+    'N': [
+        [0, 1, 1, 1, 1, 1, 1, 0],
+        [1, 2, 2, 2, 2, 2, 2, 1],
+        [1, 2, 3, 3, 3, 3, 2, 1],
+        [1, 2, 3, 4, 4, 3, 2, 1],
+        [1, 2, 3, 4, 4, 3, 2, 1],
+        [1, 2, 3, 3, 3, 3, 2, 1],
+        [1, 1, 2, 2, 2, 2, 2, 1],
+        [0, 1, 1, 1, 1, 1, 1, 0]
+    ],
+    'B': [
+        [1, 2, 2, 1, 1, 2, 2, 1],
+        [2, 4, 3, 2, 2, 3, 4, 2],
+        [2, 3, 4, 3, 3, 4, 3, 2],
+        [1, 2, 3, 4, 4, 3, 2, 1],
+        [1, 2, 3, 4, 4, 3, 2, 1],
+        [2, 3, 4, 3, 3, 4, 3, 2],
+        [2, 4, 3, 2, 2, 3, 4, 2],
+        [1, 2, 2, 1, 1, 2, 2, 1]
+    ],
+    'R': [
+        [0, 2, 2, 2, 2, 2, 2, 0],
+        [3, 3, 3, 3, 3, 3, 3, 3],
+        [1, 1, 2, 2, 2, 2, 1, 1],
+        [1, 2, 2, 2, 2, 2, 2, 1],
+        [1, 2, 2, 2, 2, 2, 2, 1],
+        [1, 1, 2, 2, 2, 2, 1, 1],
+        [1, 1, 1, 3, 3, 1, 1, 1],
+        [0, 2, 3, 4, 4, 3, 2, 0],
+    ],
+    'Q': [
+        [0, 1, 1, 3, 1, 1, 1, 0],
+        [1, 2, 3, 3, 3, 1, 1, 1],
+        [1, 4, 3, 3, 3, 4, 2, 1],
+        [1, 2, 3, 3, 3, 2, 2, 1],
+        [1, 2, 3, 3, 3, 2, 2, 1],
+        [1, 4, 3, 3, 3, 4, 2, 1],
+        [1, 2, 3, 3, 3, 1, 1, 1],
+        [0, 1, 1, 3, 1, 1, 1, 0]
+    ],
+    'K': [
+        [0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0],
+        [1, 1, 1, 0, 0, 1, 1, 1],
+        [4, 6, 4, 1, 1, 4, 6, 4],
+        [6, 8, 6, 3, 3, 6, 8, 6],
+    ]
+}
+
+# built from the tables above by buildTables(), lists are refilled in place so references to them stay valid
+MATERIAL_SCORES = {}  # material of each piece type in evaluation units, eg MATERIAL_SCORES['Q'] = 900
+PIECE_MATERIAL = {'--': 0}  # material in pawns, signed by color, eg PIECE_MATERIAL['bR'] = -5
+SQUARE_SCORES = {color + piece: [0] * 64 for color in 'wb' for piece in PIECE_VALUES}
+# SQUARE_SCORES['bN'][sq] is the whole contribution of a black knight on sq: material + square bonus,
+# negative for black & read from the mirrored table, so evaluation is a plain sum
+
+# batch evaluation encodes a board as 64 int8 piece codes, 0 for an empty square
+PIECE_CODES = {'--': 0, **{piece: code for code, piece in enumerate(SQUARE_SCORES, 1)}}
+SCORE_MATRIX = np.zeros((len(PIECE_CODES), 64), dtype=np.int32)  # SCORE_MATRIX[code] is SQUARE_SCORES of piece
+SQUARES = np.arange(64)
+
+
+def buildTables():
+    # combines material & piece-square tables into SQUARE_SCORES
+    for piece, value in PIECE_VALUES.items():
+        MATERIAL_SCORES[piece] = MATERIAL_WEIGHT * value
+        PIECE_MATERIAL['w' + piece] = value
+        PIECE_MATERIAL['b' + piece] = -value
+        table = PIECE_SQUARE_TABLES[piece]
+        white = SQUARE_SCORES['w' + piece]
+        black = SQUARE_SCORES['b' + piece]
+        for row in range(8):
+            for col in range(8):
+                white[row * 8 + col] = MATERIAL_WEIGHT * value + PIECE_SQUARE_WEIGHT * table[row][col]
+                black[row * 8 + col] = -(MATERIAL_WEIGHT * value + PIECE_SQUARE_WEIGHT * table[7 - row][col])
+        SCORE_MATRIX[PIECE_CODES['w' + piece]] = white
+        SCORE_MATRIX[PIECE_CODES['b' + piece]] = black
+
+
+def loadTables(path):
+    """
+    replaces evaluation tables with ones from a JSON file, which may hold any of
+    "pieceValues" ({"p": 1, ...}), "pieceSquareTables" ({"p": 8 rows of 8 numbers, ...}),
+    "materialWeight" & "pieceSquareWeight". whatever is left out keeps its current value.
+    game states created earlier keep their running scores, call their refreshEvaluation() afterwards
+    """
+    global MATERIAL_WEIGHT, PIECE_SQUARE_WEIGHT
+    with open(path) as file:
+        tables = json.load(file)
+
+    for piece, value in tables.get('pieceValues', {}).items():
+        if piece not in PIECE_VALUES:
+            raise ValueError("unknown piece type in " + path + ": " + piece)
+        PIECE_VALUES[piece] = value
+    for piece, table in tables.get('pieceSquareTables', {}).items():
+        if piece not in PIECE_SQUARE_TABLES:
+            raise ValueError("unknown piece type in " + path + ": " + piece)
+        if len(table) != 8 or any(len(row) != 8 for row in table):
+            raise ValueError("piece-square table for " + piece + " in " + path + " isn't 8x8")
+        PIECE_SQUARE_TABLES[piece] = [list(row) for row in table]
+    MATERIAL_WEIGHT = tables.get('materialWeight', MATERIAL_WEIGHT)
+    PIECE_SQUARE_WEIGHT = tables.get('pieceSquareWeight', PIECE_SQUARE_WEIGHT)
+    buildTables()
+
+
+def evaluateBoard(board):
+    # material & piece-square score of an 8x8 board, positive is good for white
+    score = 0
+    sq = 0
+    for piece in board.flat:
+        if piece != '--':
+            score += SQUARE_SCORES[piece][sq]
+        sq += 1
+    return score
+
+
+def encodeBoard(board):
+    # 8x8 board as 64 piece codes, square index is row * 8 + col
+    return np.fromiter((PIECE_CODES[piece] for piece in board.flat), dtype=np.int8, count=64)
+
+
+def encodePositions(boards):
+    # many boards as an (N, 64) int8 array, the format evaluateBatch takes
+    encoded = np.empty((len(boards), 64), dtype=np.int8)
+    for i, board in enumerate(boards):
+        encoded[i] = encodeBoard(board)
+    return encoded
+
+
+def toPlanes(encoded):
+    # (N, 64) piece codes to (N, 12, 64) one-hot planes, plane i holds piece with code i + 1
+    return (encoded[:, None, :] == np.arange(1, len(PIECE_CODES), dtype=np.int8)[None, :, None]).astype(np.int8)
+
+
+def evaluateBatch(positions):
+    """
+    scores of N positions in one go, same values evaluateBoard gives.
+    takes either (N, 64) piece codes or (N, 12, 64) one-hot planes, returns an int64 array of N scores
+    """
+    positions = np.asarray(positions)
+    if positions.ndim == 2:
+        # each square's code picks that square's score from its piece's row of the matrix
+        return SCORE_MATRIX[positions, SQUARES].sum(axis=1, dtype=np.int64)
+    if positions.ndim == 3:
+        return np.einsum('npq,pq->n', positions.astype(np.int64), SCORE_MATRIX[1:].astype(np.int64))
+    raise ValueError("positions must have shape (N, 64) or (N, 12, 64), got " + str(positions.shape))
+
+
+def evaluateChildren(gs, moves):
+    """
+    scores of the positions after each of the moves, without making them on the game state.
+    board is encoded once, copied per move & only squares the moves touch are rewritten, all in NumPy
+    """
+    count = len(moves)
+    if count == 0:
+        return np.zeros(0, dtype=np.int64)
+    children = np.repeat(encodeBoard(gs.board)[None, :], count, axis=0)
+    rows = np.arange(count)
+
+    startSquares = np.fromiter((move.startRow * 8 + move.startCol for move in moves), dtype=np.intp, count=count)
+    endSquares = np.fromiter((move.endRow * 8 + move.endCol for move in moves), dtype=np.intp, count=count)
+    placedPieces = np.fromiter((PIECE_CODES[move.pieceMoved[0] + move.promotionPiece if move.pawnPromotion
+                                            else move.pieceMoved] for move in moves), dtype=np.int8, count=count)
+    children[rows, startSquares] = 0
+    children[rows, endSquares] = placedPieces
+
+    for i, move in enumerate(moves):
+        # en-passant & castling touch squares besides start & end, they're rare enough to patch one by one
+        if move.isEnpassantMove:
+            children[i, move.startRow * 8 + move.endCol] = 0
+        elif move.isCastleMove:
+            rookFrom, rookTo = (move.endCol + 1, move.endCol - 1) if move.endCol - move.startCol == 2 \
+                else (move.endCol - 2, move.endCol + 1)
+            children[i, move.endRow * 8 + rookTo] = children[i, move.endRow * 8 + rookFrom]
+            children[i, move.endRow * 8 + rookFrom] = 0
+    return evaluateBatch(children)
+
+
+buildTables()
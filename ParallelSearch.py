@@ -0,0 +1,200 @@
+"""
+Parallel search over several processes.
+Responsible for :
+-root splitting: root moves are shared out to a process pool, each worker searching on its own GameState copy
+-sharing the best score found so far between workers, so later root moves are searched with a narrower window
+-giving the same move every run when a seed is passed
+-lazy SMP: every worker searches the whole tree, sharing one transposition table in shared memory
+"""
+
+import multiprocessing
+import os
+import queue
+import random
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import BestMoveFinder
+import TranspositionTable
+
+# state of a worker process, filled in once by its initializer
+workerGameState = None
+workerRootMoves = None
+workerEngine = None  # BestMoveFinder.SearchEngine of this worker
+workerAlpha = None  # multiprocessing.Value shared by all workers, best root score found so far
+workerSharedMemory = None  # kept referenced, table's entries live in its buffer
+workerStopEvent = None  # set once main lazy SMP worker is done, so helpers stop too
+workerMainStopEvent = None  # caller's stop event for main lazy SMP worker, may be None
+workerReports = None  # multiprocessing.Queue main lazy SMP worker puts iterationReport of each depth in, or None
+
+SEEDED_TT_SIZE_MB = 1  # table of a seeded root split worker, cleared for every root move so it's kept small
+nodesSearched = 0  # nodes searched by all workers in last call of findBestMoveParallel / findBestMoveLazySMP
+
+
+def initWorker(gs, rootMoves, sharedAlpha, seeded):
+    # runs once in each worker process, position & root moves are sent once instead of with every task
+    global workerGameState, workerRootMoves, workerEngine, workerAlpha
+    workerGameState = gs
+    workerRootMoves = rootMoves
+    workerEngine = BestMoveFinder.SearchEngine(ttSizeMB=SEEDED_TT_SIZE_MB if seeded else BestMoveFinder.TT_SIZE_MB)
+    workerAlpha = sharedAlpha
+
+
+def searchRootMove(moveIndex, depth, seed):
+    """
+    searches one root move in a worker & returns (score, nodes) from the root player's side.
+    window starts just below best score other workers found so far, a move scoring lower only proves that,
+    a move scoring the same or better gets its exact score
+    """
+    gs = workerGameState
+    engine = workerEngine
+    move = workerRootMoves[moveIndex]
+    if seed is not None:
+        # result may only depend on the move searched, not on what this worker searched before
+        engine.clear()
+        engine.random.seed(seed * 1000003 + depth * 1009 + moveIndex)
+    engine.rootDepth = depth
+    engine.rootPly = len(gs.moveLog)
+    engine.nodesSearched = 0
+
+    alpha = max(workerAlpha.value - 1, -BestMoveFinder.CHECKMATE)
+    turnMultiplier = 1 if gs.whiteToMove else -1
+    gs.makeMove(move)
+    score = -engine.findMoveNegaMax(gs, None, depth - 1, -BestMoveFinder.CHECKMATE, -alpha, -turnMultiplier)
+    gs.undoMove()
+
+    with workerAlpha.get_lock():
+        if score > workerAlpha.value:
+            workerAlpha.value = score
+    return score, engine.nodesSearched
+
+
+def findBestMoveParallel(gs, validMoves, depth=None, workers=None, seed=None):
+    """
+    root-split search: iterative deepening to depth (DEPTH by default), each iteration searches the
+    first root move alone to get a bound (young brothers wait), then the rest of them in parallel.
+    with a seed, ties & move ordering are settled the same way every run, so the same move comes back
+    """
+    global nodesSearched
+    depth = BestMoveFinder.DEPTH if depth is None else depth
+    workers = workers or os.cpu_count() or 1
+    nodesSearched = 0
+    if len(validMoves) == 0:
+        return None
+
+    # index in this list breaks ties between equal scores, so it's built only from the moves & the seed
+    rootMoves = list(validMoves)
+    if BestMoveFinder.RANDOMIZE_MOVE_ORDER:
+        random.Random(seed).shuffle(rootMoves)
+    BestMoveFinder.orderCaptures(rootMoves)
+    order = list(range(len(rootMoves)))
+    sharedAlpha = multiprocessing.Value('i', -BestMoveFinder.CHECKMATE)
+
+    bestIndex = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=initWorker,
+                             initargs=(gs, rootMoves, sharedAlpha, seed is not None)) as pool:
+        for iterationDepth in range(1, depth + 1):
+            sharedAlpha.value = -BestMoveFinder.CHECKMATE
+            scores = {}
+            # eldest brother first, its score lets every other move start with a narrow window
+            scores[order[0]], nodes = pool.submit(searchRootMove, order[0], iterationDepth, seed).result()
+            nodesSearched += nodes
+            futures = {index: pool.submit(searchRootMove, index, iterationDepth, seed) for index in order[1:]}
+            for index, future in futures.items():
+                scores[index], nodes = future.result()
+                nodesSearched += nodes
+
+            bestIndex = max(order, key=lambda index: (scores[index], -index))
+            # next iteration starts with this one's best move, rest by score
+            order.sort(key=lambda index: (index != bestIndex, -scores[index], index))
+    return rootMoves[bestIndex]
+
+
+def iterationReport(engine, gs):
+    # (depth, score, nodes, seconds, principal variation in long algebraic notation) of engine's last completed depth
+    pv = engine.principalVariation(gs, engine.completedDepth)
+    return (engine.completedDepth, engine.bestScore, engine.nodesSearched, engine.elapsed,
+            [move.getChessNotation() for move in pv])
+
+
+def initLazySMPWorker(gs, rootMoves, sharedMemoryName, sizeMB, stopEvent, mainStopEvent, reports):
+    # attaches worker's engine to the shared table, its search then reads & writes entries of every other worker
+    global workerGameState, workerRootMoves, workerEngine, workerSharedMemory, workerStopEvent, workerMainStopEvent, \
+        workerReports
+    workerGameState = gs
+    workerRootMoves = rootMoves
+    workerStopEvent = stopEvent
+    workerMainStopEvent = mainStopEvent
+    workerReports = reports
+    workerSharedMemory = shared_memory.SharedMemory(name=sharedMemoryName)
+    workerEngine = BestMoveFinder.SearchEngine(
+        transpositionTable=TranspositionTable.TranspositionTable(sizeMB, workerSharedMemory.buf))
+
+
+def lazySMPSearch(workerID, depth, timeLimit, maxNodes, seed):
+    """
+    full iterative deepening search in one worker, returns (moveID, nodes).
+    helpers (workerID > 0) differ from main worker so they don't all walk the same tree in step:
+    odd ones go one ply deeper & each shuffles equally ranked moves with its own seed.
+    only main worker has a node limit & reports its iterations, helpers stop when it's done
+    """
+    engine = workerEngine
+    engine.random.seed(None if seed is None else seed * 1000003 + workerID)
+    engine.depth = depth + (workerID & 1)
+    engine.onIteration = None
+    if workerID == 0 and workerReports is not None:
+        engine.onIteration = lambda engine, gs: workerReports.put(iterationReport(engine, gs))
+    move = engine.findBestMove(workerGameState, list(workerRootMoves), timeLimit=timeLimit,
+                               maxNodes=None if workerID else maxNodes,
+                               stop=workerStopEvent if workerID else workerMainStopEvent)
+    return (move.moveID if move is not None else None), engine.nodesSearched
+
+
+def findBestMoveLazySMP(gs, validMoves, depth=None, workers=None, timeLimit=None, seed=None, stop=None,
+                        sizeMB=None, maxNodes=None, onIteration=None):
+    """
+    lazy SMP: all workers search the same root at once & share one transposition table, so each finds
+    entries others stored & skips or reorders those parts of the tree. no positions or moves are passed
+    between processes during the search, only through the table.
+    move of main worker (depth DEPTH, or whatever depth its timeLimit / maxNodes allow) is returned, helpers stop
+    with it. maxNodes counts main worker's nodes only. stop is a multiprocessing.Event that ends the search early
+    when set. table takes sizeMB (default TT_SIZE_MB), & onIteration is called with main worker's iterationReport
+    after each depth it completes, in the calling process
+    """
+    global nodesSearched
+    depth = BestMoveFinder.DEPTH if depth is None else depth
+    workers = workers or os.cpu_count() or 1
+    nodesSearched = 0
+    if len(validMoves) == 0:
+        return None
+
+    sizeMB = sizeMB or BestMoveFinder.TT_SIZE_MB
+    sharedMemory = shared_memory.SharedMemory(create=True, size=TranspositionTable.tableBytes(sizeMB))
+    try:
+        TranspositionTable.TranspositionTable(sizeMB, sharedMemory.buf).clear()
+        stopEvent = multiprocessing.Event()
+        reports = multiprocessing.Queue() if onIteration is not None else None
+        with ProcessPoolExecutor(max_workers=workers, initializer=initLazySMPWorker,
+                                 initargs=(gs, list(validMoves), sharedMemory.name, sizeMB, stopEvent, stop,
+                                           reports)) as pool:
+            futures = [pool.submit(lazySMPSearch, workerID, depth, timeLimit, maxNodes, seed)
+                       for workerID in range(workers)]
+            while reports is not None:
+                # main worker's reports are passed on as they come, until it was done before a wait found none left
+                finished = futures[0].done()
+                try:
+                    onIteration(*reports.get(timeout=0.05))
+                except queue.Empty:
+                    if finished:
+                        break
+            moveID, nodes = futures[0].result()
+            stopEvent.set()
+            nodesSearched = nodes + sum(future.result()[1] for future in futures[1:])
+    finally:
+        sharedMemory.close()
+        sharedMemory.unlink()
+
+    for move in validMoves:
+        if move.moveID == moveID:
+            return move
+    return None
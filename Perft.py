@@ -0,0 +1,118 @@
+"""
+Perft: counts leaf nodes of the move generation tree to a fixed depth.
+Responsible for :
+-verifying getValidMoves / makeMove / undoMove against known node counts of standard test positions
+-measuring move generation speed in nodes per second
+Run `python Perft.py` for the whole suite, `python Perft.py --help` for the other options.
+"""
+
+import argparse
+import sys
+import time
+
+import BitboardEngine
+import ChessEngine
+
+# standard perft positions with reference node counts for depth 1, 2, 3...
+# (from https://www.chessprogramming.org/Perft_Results & http://talkchess.com/forum3/viewtopic.php?f=7&t=71379)
+PERFT_SUITE = (
+    ("start position", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+     (20, 400, 8902, 197281, 4865609)),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     (48, 2039, 97862, 4085603)),
+    ("position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     (14, 191, 2812, 43238, 674624)),
+    ("position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     (6, 264, 9467, 422333)),
+    ("position 4 mirrored", "r2q1rk1/pP1p2pp/Q4n2/bbp1p3/Np6/1B3NBn/pPPP1PPP/R3K2R b KQ - 0 1",
+     (6, 264, 9467, 422333)),
+    ("position 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     (44, 1486, 62379, 2103487)),
+    ("position 6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     (46, 2079, 89890, 3894594)),
+    # smaller positions aimed at promotions, pins & en-passant edge cases
+    ("promotions 1", "8/ppp3p1/8/8/3p4/5Q2/1ppp2K1/brk4n w - - 0 1", (27, 390, 9354, 134167)),
+    ("promotions 2", "8/6kR/8/8/8/bq6/1rqqqqqq/K1nqnbrq b - - 0 1", (7, 52, 4593, 50268)),
+    ("en-passant evasion", "8/8/8/1k6/3Pp3/8/8/4KQ2 b - d3 0 1", (6, 121, 711)),
+    ("en-passant pinned", "1b1k4/8/8/1rPpK3/8/8/8/8 w - d6 0 1", (5, 100, 555)),
+    ("en-passant in check", "rnbqk1nr/bb3p1p/1q2r3/2pPp3/3P4/7P/1PP1NpPP/R1BQKBNR w KQkq c6 0 1", (2, 92, 2528)),
+)
+
+ENGINES = {'bitboard': BitboardEngine.GameState, 'array': ChessEngine.GameState}
+
+
+def perft(gs, depth):
+    # number of leaf nodes at given depth, moves at the last ply are counted without being made
+    moves = gs.getValidMoves()
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    for move in moves:
+        gs.makeMove(move)
+        nodes += perft(gs, depth - 1)
+        gs.undoMove()
+    return nodes
+
+
+def divide(gs, depth):
+    # perft split by root move, {move notation: nodes}, for finding which move a wrong count comes from
+    counts = {}
+    for move in gs.getValidMoves():
+        gs.makeMove(move)
+        counts[move.getChessNotation()] = perft(gs, depth - 1)
+        gs.undoMove()
+    return counts
+
+
+def runSuite(maxDepth, gameStateClass, out=sys.stdout):
+    # runs every suite position up to maxDepth, prints a line per depth & returns number of mismatches
+    mismatches = 0
+    totalNodes = 0
+    totalTime = 0
+    for name, fen, expectedCounts in PERFT_SUITE:
+        for depth in range(1, min(maxDepth, len(expectedCounts)) + 1):
+            gs = gameStateClass.fromFen(fen)
+            start = time.perf_counter()
+            nodes = perft(gs, depth)
+            elapsed = time.perf_counter() - start
+            totalNodes += nodes
+            totalTime += elapsed
+            expected = expectedCounts[depth - 1]
+            status = "ok" if nodes == expected else "MISMATCH (expected " + str(expected) + ")"
+            if nodes != expected:
+                mismatches += 1
+            print("%-20s depth %d  %10d nodes  %8.2fs  %9.0f nps  %s" %
+                  (name, depth, nodes, elapsed, nodes / elapsed if elapsed else 0, status), file=out)
+    print("total %d nodes in %.2fs, %.0f nps, %d mismatches" %
+          (totalNodes, totalTime, totalNodes / totalTime if totalTime else 0, mismatches), file=out)
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perft node counts & move generation speed")
+    parser.add_argument('--depth', type=int, default=3, help="depth to search (suite runs every depth up to it)")
+    parser.add_argument('--fen', help="count a single position instead of running the suite")
+    parser.add_argument('--divide', action='store_true', help="with --fen, print node count of each root move")
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='bitboard', help="game state to test")
+    args = parser.parse_args(argv)
+    gameStateClass = ENGINES[args.engine]
+
+    if args.fen is None:
+        return 1 if runSuite(args.depth, gameStateClass) else 0
+
+    gs = gameStateClass.fromFen(args.fen)
+    start = time.perf_counter()
+    if args.divide:
+        counts = divide(gs, args.depth)
+        for notation in sorted(counts):
+            print(notation + ": " + str(counts[notation]))
+        nodes = sum(counts.values())
+    else:
+        nodes = perft(gs, args.depth)
+    elapsed = time.perf_counter() - start
+    print("%d nodes in %.2fs, %.0f nps" % (nodes, elapsed, nodes / elapsed if elapsed else 0))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
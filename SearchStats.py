@@ -0,0 +1,177 @@
+"""
+Statistics of one search, for tuning the engine & noticing when a change makes it worse.
+Responsible for :
+-counting nodes, quiescence nodes, transposition table hits / misses / collisions & beta cutoffs
+-nodes & branching factor of each depth of iterative deepening
+-timing move generation, evaluation & making / taking back moves
+-reporting it all as a dict or a JSON line
+Everything is measured by wrapping the engine's & game state's methods for the length of one search, so a search
+without statistics runs exactly the code it would if this module didn't exist.
+"""
+
+import json
+import sys
+import time
+
+from TranspositionTable import SLOTS_PER_BUCKET
+
+try:
+    import resource  # not available on Windows, peak memory is reported as None there
+except ImportError:
+    resource = None
+
+# game state methods timed under each heading, time spent in the rest of the search is reported as 'search'
+TIMED_METHODS = {
+    'moveGeneration': ('getValidMoves', 'getPseudoLegalMoves'),
+    'evaluation': ('updateEvaluation',),
+    'makeUndo': ('makeMove', 'undoMove', 'tryMove', 'makeNullMove', 'undoNullMove'),
+}
+
+
+class SearchStats:
+    def __init__(self):
+        self.nodes = 0
+        self.qnodes = 0
+        self.ttHits = 0
+        self.ttMisses = 0
+        self.ttCollisions = 0  # misses where the bucket was taken by other positions
+        self.cutoffs = 0  # nodes that failed high after searching at least one move
+        self.firstMoveCutoffs = 0  # of those, failed high on the first legal move
+        self.depths = []  # dict for each completed depth
+        self.times = {category: 0.0 for category in TIMED_METHODS}
+        self.elapsed = 0.0
+        self.startTime = 0.0
+        self.nestedTime = 0.0  # time of timed calls inside the one being timed, taken off its own
+        self.legalMoves = []  # moves made so far in each node being searched, innermost last
+        self.wrapped = []  # (object, name, own attribute it replaced or None) of every wrapper put in place
+
+    def attach(self, engine, gs):
+        # puts counting & timing wrappers in place as instance attributes, they shadow the class methods
+        self.startTime = time.perf_counter()
+        self.wrap(engine, 'findMoveNegaMax', self.countNegaMax)
+        self.wrap(engine, 'quiescenceSearch', self.countQuiescence)
+        self.wrap(engine.transpositionTable, 'probe', self.countProbe)
+        for category, names in TIMED_METHODS.items():
+            for name in names:
+                if hasattr(gs, name):
+                    self.wrap(gs, name, self.timer(category))
+        if engine.evaluator is not None:
+            self.wrap(engine, 'evaluator', self.timer('evaluation'))
+        self.wrap(gs, 'tryMove', self.countLegalMove)  # wraps timed tryMove again
+
+    def detach(self, engine):
+        # takes wrappers out again, so later searches run the plain methods
+        for owner, name, replaced in reversed(self.wrapped):
+            if replaced is not None:
+                setattr(owner, name, replaced)
+            else:
+                delattr(owner, name)
+        self.wrapped = []
+        self.nodes = engine.nodesSearched
+        self.elapsed = time.perf_counter() - self.startTime
+
+    def wrap(self, owner, name, makeWrapper):
+        original = getattr(owner, name)
+        self.wrapped.append((owner, name, vars(owner).get(name)))
+        setattr(owner, name, makeWrapper(original))
+
+    def timer(self, category):
+        def makeWrapper(function):
+            def timed(*args):
+                # exclusive time, calls timed inside this one (eg makeMove inside tryMove) count only for theirs
+                outerNested = self.nestedTime
+                self.nestedTime = 0.0
+                start = time.perf_counter()
+                try:
+                    return function(*args)
+                finally:
+                    elapsed = time.perf_counter() - start
+                    self.times[category] += elapsed - self.nestedTime
+                    self.nestedTime = outerNested + elapsed
+            return timed
+        return makeWrapper
+
+    def countNegaMax(self, function):
+        def counted(gs, validMoves, depth, alpha, beta, turnMultiplier):
+            self.legalMoves.append(0)
+            try:
+                score = function(gs, validMoves, depth, alpha, beta, turnMultiplier)
+            finally:
+                legalMoves = self.legalMoves.pop()
+            if score >= beta and legalMoves and depth > 0:
+                self.cutoffs += 1
+                if legalMoves == 1:
+                    self.firstMoveCutoffs += 1
+            return score
+        return counted
+
+    def countQuiescence(self, function):
+        def counted(*args):
+            self.qnodes += 1
+            self.legalMoves.append(0)  # its moves aren't counted for the node that called it
+            try:
+                return function(*args)
+            finally:
+                self.legalMoves.pop()
+        return counted
+
+    def countLegalMove(self, function):
+        def counted(move):
+            legal = function(move)
+            if legal and self.legalMoves:
+                self.legalMoves[-1] += 1
+            return legal
+        return counted
+
+    def countProbe(self, function):
+        table = function.__self__
+
+        def counted(key):
+            entry = function(key)
+            if entry is not None:
+                self.ttHits += 1
+            else:
+                self.ttMisses += 1
+                slot = (key & table.bucketMask) * SLOTS_PER_BUCKET
+                if table.data[slot:slot + SLOTS_PER_BUCKET].any():
+                    self.ttCollisions += 1
+            return entry
+        return counted
+
+    def endIteration(self, engine):
+        # called after each completed depth, branching factor is its nodes over those of the depth before
+        nodes = engine.nodesSearched - sum(depth['nodes'] for depth in self.depths)
+        previous = self.depths[-1]['nodes'] if self.depths else 0
+        self.depths.append({'depth': engine.completedDepth, 'nodes': nodes,
+                            'time': round(time.perf_counter() - self.startTime, 4),
+                            'branchingFactor': round(nodes / previous, 2) if previous else None})
+
+    def asDict(self):
+        probes = self.ttHits + self.ttMisses
+        timed = sum(self.times.values())
+        times = {category: round(seconds, 4) for category, seconds in self.times.items()}
+        times['search'] = round(max(self.elapsed - timed, 0.0), 4)
+        return {
+            'nodes': self.nodes,
+            'qnodes': self.qnodes,
+            'nps': int(self.nodes / self.elapsed) if self.elapsed else 0,
+            'time': round(self.elapsed, 4),
+            'ttHitRate': round(self.ttHits / probes, 4) if probes else 0.0,
+            'ttMissRate': round(self.ttMisses / probes, 4) if probes else 0.0,
+            'ttCollisionRate': round(self.ttCollisions / probes, 4) if probes else 0.0,
+            'firstMoveCutoffRate': round(self.firstMoveCutoffs / self.cutoffs, 4) if self.cutoffs else 0.0,
+            'depths': self.depths,
+            'times': times,
+            'peakMemoryKB': peakMemoryKB(),
+        }
+
+    def toJson(self):
+        return json.dumps(self.asDict())
+
+
+def peakMemoryKB():
+    # most memory the process has held so far, the search's own peak can't be told apart from it
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak  # macOS reports bytes, Linux kilobytes
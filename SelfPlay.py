@@ -0,0 +1,365 @@
+"""
+Headless engine-vs-engine matches, to check a change really makes the engine stronger.
+Responsible for :
+-playing games between a new & an old engine setting over a process pool, without pygame
+-time controls: fixed depth, fixed time per move, or a clock with increment
+-openings from a file of FENs, each played twice so both settings get both colours
+-writing every game to a PGN file, moves in SAN
+-Elo difference with its 95% error margin, & an SPRT that ends the match as soon as the result is clear
+Run eg `python SelfPlay.py --games 2000 --tc 5+0.05 --new lateMoveReductions=False --sprt 0 10 --pgn lmr.pgn`,
+the settings are SearchEngine attributes, with results counted for the new one.
+"""
+
+import argparse
+import ast
+import math
+import os
+import sys
+import textwrap
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import BestMoveFinder
+import BitboardEngine
+from UciMain import START_FEN, timeForMove
+
+MAX_PLIES = 400  # game still going after this many moves (counting both sides) is adjudicated a draw
+# balanced positions a few moves into common openings, used when no openings file is given
+OPENINGS = [
+    'r1bqkbnr/pppp1ppp/2n5/1B2p3/4P3/5N2/PPPP1PPP/RNBQK2R b KQkq - 3 3',  # Ruy Lopez
+    'r1bqk1nr/pppp1ppp/2n5/2b1p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4',  # Italian
+    'rnbqkbnr/pp2pppp/3p4/2p5/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 0 3',  # Sicilian
+    'rnbqkbnr/ppp2ppp/4p3/3p4/3PP3/8/PPP2PPP/RNBQKBNR w KQkq - 0 3',  # French
+    'rnbqkbnr/pp2pppp/2p5/3p4/3PP3/8/PPP2PPP/RNBQKBNR w KQkq - 0 3',  # Caro-Kann
+    'rnbqkbnr/ppp2ppp/4p3/3p4/2PP4/8/PP2PPPP/RNBQKBNR w KQkq - 0 3',  # Queen's Gambit Declined
+    'rnbqk2r/pppp1ppp/4pn2/8/1bPP4/2N5/PP2PPPP/R1BQKBNR w KQkq - 2 4',  # Nimzo-Indian
+    'rnbqk2r/ppppppbp/5np1/8/2PP4/2N5/PP2PPPP/R1BQKBNR w KQkq - 2 4',  # King's Indian
+    'rnbqkbnr/pppp1ppp/8/4p3/2P5/8/PP1PPPPP/RNBQKBNR w KQkq - 0 2',  # English
+    'rnbqkbnr/ppp1pppp/8/3p4/8/5NP1/PPPPPP1P/RNBQKB1R b KQkq - 0 2',  # Reti
+]
+ENGINE_ARGUMENTS = ('ttSizeMB', 'book', 'tablebase')  # settings SearchEngine takes when it's created
+RESULT_SCORES = {'1-0': 1.0, '0-1': 0.0, '1/2-1/2': 0.5}
+
+
+def parseConfig(text):
+    # "nullMovePruning=False, depth=4" -> {'nullMovePruning': False, 'depth': 4}, values that aren't literals stay text
+    config = {}
+    for item in text.split(','):
+        if not item.strip():
+            continue
+        name, separator, value = item.partition('=')
+        if not separator:
+            raise ValueError("engine setting needs name=value: " + item.strip())
+        try:
+            config[name.strip()] = ast.literal_eval(value.strip())
+        except (ValueError, SyntaxError):
+            config[name.strip()] = value.strip()
+    return config
+
+
+def configText(config):
+    return ', '.join('%s=%r' % item for item in config.items()) or 'default'
+
+
+def makeEngine(config, seed, depth=BestMoveFinder.DEPTH):
+    # a depth among the settings wins over the one of the match
+    engine = BestMoveFinder.SearchEngine(depth=depth, seed=seed, **{name: value for name, value in config.items()
+                                                      if name in ENGINE_ARGUMENTS})
+    for name, value in config.items():
+        if name not in ENGINE_ARGUMENTS:
+            if not hasattr(engine, name):
+                raise ValueError("SearchEngine has no setting " + name)
+            setattr(engine, name, value)
+    return engine
+
+
+def loadOpenings(path):
+    # one FEN (or EPD, its first 4 fields) per line, blank lines & lines starting with # are skipped
+    openings = []
+    with open(path) as file:
+        for line in file:
+            fields = line.split()
+            if fields and not fields[0].startswith('#'):
+                openings.append(' '.join(fields[:6] if len(fields) >= 6 and fields[4].isdigit() else fields[:4]))
+    if not openings:
+        raise ValueError("no positions in openings file " + path)
+    return openings
+
+
+def toSan(gs, move, validMoves):
+    # standard algebraic notation of a legal move, eg Nbd7, exd5, e8=Q+, O-O#
+    if move.isCastleMove:
+        san = "O-O" if move.endCol > move.startCol else "O-O-O"
+    else:
+        endSquare = move.getRankFile(move.endRow, move.endCol)
+        if move.pieceMoved[1] == 'p':
+            san = (move.colsToFiles[move.startCol] + 'x' if move.isCapture else '') + endSquare
+            if move.pawnPromotion:
+                san += '=' + move.promotionPiece
+        else:
+            # other pieces of the same kind that can reach the same square decide how much of the start is given
+            rivals = [other for other in validMoves if other.pieceMoved == move.pieceMoved and
+                      (other.endRow, other.endCol) == (move.endRow, move.endCol) and
+                      (other.startRow, other.startCol) != (move.startRow, move.startCol)]
+            start = ''
+            if rivals:
+                if all(other.startCol != move.startCol for other in rivals):
+                    start = move.colsToFiles[move.startCol]
+                elif all(other.startRow != move.startRow for other in rivals):
+                    start = move.rowsToRanks[move.startRow]
+                else:
+                    start = move.getRankFile(move.startRow, move.startCol)
+            san = move.pieceMoved[1] + start + ('x' if move.isCapture else '') + endSquare
+    gs.makeMove(move)
+    if gs.isInCheck():
+        san += '#' if len(gs.getValidMoves()) == 0 else '+'
+    gs.undoMove()
+    return san
+
+
+def gameOver(gs, validMoves, plies, maxPlies):
+    # (result, reason) once game has ended, else None. validMoves have to be those of the current position
+    if len(validMoves) == 0:
+        if gs.isInCheck():
+            return ('0-1' if gs.whiteToMove else '1-0'), "checkmate"
+        return '1/2-1/2', "stalemate"
+    if gs.halfmoveClock >= 100:
+        return '1/2-1/2', "fifty move rule"
+    # repetitions can only go back to last capture or pawn move
+    if gs.zobristLog[-1 - gs.halfmoveClock:].count(gs.zobristKey) >= 3:
+        return '1/2-1/2', "threefold repetition"
+    pieces = [piece for piece in gs.board.flat if piece != '--' and piece[1] != 'K']
+    if len(pieces) == 0 or (len(pieces) == 1 and pieces[0][1] in 'NB'):
+        return '1/2-1/2', "insufficient material"
+    if plies >= maxPlies:
+        return '1/2-1/2', "move limit"
+    return None
+
+
+def playGame(gameNumber, fen, newIsWhite, configs, depth, moveTime, clock, maxPlies, seed):
+    """
+    plays one game, in a worker process. configs are the (new, old) engine settings.
+    without moveTime or clock each side searches to depth, a clock is (seconds, increment) for each side
+    """
+    gs = BitboardEngine.GameState.fromFen(fen)
+    white, black = (0, 1) if newIsWhite else (1, 0)
+    depth = BestMoveFinder.DEPTH if depth is None else depth
+    engines = {white: makeEngine(configs[white], seed * 2, depth),
+               black: makeEngine(configs[black], seed * 2 + 1, depth)}
+    clocks = {white: clock[0], black: clock[0]} if clock else None
+    startMove, startWhite = gs.fullmoveNumber, gs.whiteToMove
+    sanMoves = []
+    termination = "normal"
+    while True:
+        validMoves = gs.getValidMoves()
+        over = gameOver(gs, validMoves, len(sanMoves), maxPlies)
+        if over is not None:
+            result, reason = over
+            if reason == "move limit":
+                termination = "adjudication"
+            break
+        side = white if gs.whiteToMove else black
+        timeLimit = moveTime if clocks is None else timeForMove(clocks[side], clock[1])
+        start = time.time()
+        move = engines[side].findBestMove(gs, validMoves, timeLimit=timeLimit) or validMoves[0]
+        if clocks is not None:
+            clocks[side] -= time.time() - start
+            if clocks[side] < 0:
+                result = '0-1' if gs.whiteToMove else '1-0'
+                reason = ("white" if gs.whiteToMove else "black") + " lost on time"
+                termination = "time forfeit"
+                break
+            clocks[side] += clock[1]
+        sanMoves.append(toSan(gs, move, validMoves))
+        gs.makeMove(move)
+
+    return {'gameNumber': gameNumber, 'fen': fen, 'newIsWhite': newIsWhite, 'result': result, 'reason': reason,
+            'termination': termination, 'sanMoves': sanMoves, 'startMove': startMove, 'startWhite': startWhite}
+
+
+def gamePgn(game, configs, timeControl):
+    names = ("new (%s)" % configText(configs[0]), "old (%s)" % configText(configs[1]))
+    white, black = names if game['newIsWhite'] else names[::-1]
+    tags = [('Event', "SelfPlay"), ('Site', "?"), ('Date', time.strftime("%Y.%m.%d")),
+            ('Round', str(game['gameNumber'])), ('White', white), ('Black', black), ('Result', game['result'])]
+    if game['fen'] != START_FEN:
+        tags += [('SetUp', "1"), ('FEN', game['fen'])]
+    tags += [('TimeControl', timeControl), ('Termination', game['termination']),
+             ('PlyCount', str(len(game['sanMoves'])))]
+
+    tokens = []
+    moveNumber, whiteToMove = game['startMove'], game['startWhite']
+    for i, san in enumerate(game['sanMoves']):
+        if whiteToMove:
+            tokens.append("%d." % moveNumber)
+        elif i == 0:
+            tokens.append("%d..." % moveNumber)
+        tokens.append(san)
+        if not whiteToMove:
+            moveNumber += 1
+        whiteToMove = not whiteToMove
+    tokens += ["{%s}" % game['reason'], game['result']]
+    return ''.join('[%s "%s"]\n' % (name, value.replace('\\', '\\\\').replace('"', '\\"')) for name, value in tags) + \
+        '\n' + textwrap.fill(' '.join(tokens), 79) + '\n\n'
+
+
+def expectedScore(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def eloFromScore(score):
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return 400 * math.log10(score / (1 - score))
+
+
+def scoreVariance(wins, draws, losses):
+    # (mean score, variance of one game's score)
+    games = wins + draws + losses
+    score = (wins + draws / 2) / games
+    return score, (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+
+
+def eloDifference(wins, draws, losses):
+    # Elo difference & its 95% error margin, from the new setting's side
+    score, variance = scoreVariance(wins, draws, losses)
+    elo = eloFromScore(score)
+    if variance == 0:
+        return elo, math.inf  # every game scored the same, eg all draws, which says nothing about the spread
+    margin = 1.96 * math.sqrt(variance / (wins + draws + losses))
+    return elo, (eloFromScore(min(score + margin, 1)) - eloFromScore(max(score - margin, 0))) / 2
+
+
+def sprtLlr(wins, draws, losses, elo0, elo1):
+    """
+    log likelihood ratio of elo1 over elo0 being the real difference, in the normal approximation of the game
+    scores that cutechess & fishtest use for their SPRT
+    """
+    games = wins + draws + losses
+    score, variance = scoreVariance(wins, draws, losses)
+    if variance == 0:
+        return 0.0
+    score0, score1 = expectedScore(elo0), expectedScore(elo1)
+    return (score1 - score0) * (2 * score - score0 - score1) / (2 * variance / games)
+
+
+def sprtBounds(alpha, beta):
+    # LLR at or below lower accepts elo0, at or above upper accepts elo1
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+def runMatch(newConfig, oldConfig, games=100, openings=None, depth=None, moveTime=None, clock=None, workers=None,
+             pgnPath=None, sprt=None, maxPlies=MAX_PLIES, seed=0, report=print):
+    """
+    plays games between the engine settings over a process pool & returns the totals as a dict, from new's side.
+    sprt is (elo0, elo1, alpha, beta), the match stops once it accepts either hypothesis.
+    games go to pgnPath in the order they finish, report gets a line of running totals after each
+    """
+    openings = openings or OPENINGS
+    configs = (newConfig, oldConfig)
+    for config in configs:
+        makeEngine(config, 0)  # bad settings fail here rather than in every worker
+    if clock:
+        timeControl = "%g+%g" % clock
+    elif moveTime:
+        timeControl = "%g/move" % moveTime
+    else:
+        timeControl = "depth %d" % (depth or BestMoveFinder.DEPTH)
+    bounds = sprtBounds(sprt[2], sprt[3]) if sprt else None
+    wins = draws = losses = 0
+    llr = 0.0
+    decision = None
+
+    pgnFile = open(pgnPath, 'a') if pgnPath else None
+    try:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+            # each opening twice in a row, colours swapped, so neither setting gets the better side of it
+            futures = [pool.submit(playGame, i + 1, openings[(i // 2) % len(openings)], i % 2 == 0, configs,
+                                   depth, moveTime, clock, maxPlies, seed + i) for i in range(games)]
+            for future in as_completed(futures):
+                game = future.result()
+                score = RESULT_SCORES[game['result']]
+                score = score if game['newIsWhite'] else 1 - score
+                if score == 1:
+                    wins += 1
+                elif score == 0:
+                    losses += 1
+                else:
+                    draws += 1
+                if pgnFile is not None:
+                    pgnFile.write(gamePgn(game, configs, timeControl))
+                    pgnFile.flush()
+
+                elo, margin = eloDifference(wins, draws, losses)
+                line = "game %d: %s %s  +%d =%d -%d  elo %.1f +- %.1f" % (
+                    game['gameNumber'], game['result'], game['reason'], wins, draws, losses, elo, margin)
+                if sprt:
+                    llr = sprtLlr(wins, draws, losses, sprt[0], sprt[1])
+                    line += "  LLR %.2f (%.2f, %.2f)" % (llr, bounds[0], bounds[1])
+                    if llr <= bounds[0]:
+                        decision = "H0 accepted"
+                    elif llr >= bounds[1]:
+                        decision = "H1 accepted"
+                report(line)
+                if decision is not None:
+                    report("SPRT: " + decision)
+                    pool.shutdown(cancel_futures=True)  # games already being played are finished, not counted
+                    break
+    finally:
+        if pgnFile is not None:
+            pgnFile.close()
+
+    elo, margin = eloDifference(wins, draws, losses) if wins + draws + losses else (0.0, math.inf)
+    return {'games': wins + draws + losses, 'wins': wins, 'draws': draws, 'losses': losses, 'elo': elo,
+            'eloMargin': margin, 'llr': llr if sprt else None, 'sprt': decision}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play the engine against itself with two settings")
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--new', default='',
+                        help="settings of engine tested, eg 'lateMoveReductions=False, razoring=False'")
+    parser.add_argument('--old', default='', help="settings it's compared against, default settings if left out")
+    limit = parser.add_mutually_exclusive_group()
+    limit.add_argument('--depth', type=int, help="search each move to this depth")
+    limit.add_argument('--movetime', type=float, help="seconds per move")
+    limit.add_argument('--tc', help="clock of each side, seconds+increment, eg 10+0.1")
+    parser.add_argument('--openings', help="file of start positions, one FEN per line")
+    parser.add_argument('--pgn', default='selfplay.pgn', help="file games are added to")
+    parser.add_argument('--workers', type=int, help="processes playing games, default one per core")
+    parser.add_argument('--sprt', type=float, nargs=2, metavar=('ELO0', 'ELO1'),
+                        help="stop once new is shown to be ELO0 or ELO1 stronger")
+    parser.add_argument('--alpha', type=float, default=0.05)
+    parser.add_argument('--beta', type=float, default=0.05)
+    parser.add_argument('--max-plies', type=int, default=MAX_PLIES)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    try:
+        newConfig, oldConfig = parseConfig(args.new), parseConfig(args.old)
+        openings = loadOpenings(args.openings) if args.openings else None
+        for fen in openings or ():
+            BitboardEngine.GameState.fromFen(fen)
+        clock = None
+        if args.tc:
+            base, _, increment = args.tc.partition('+')
+            clock = (float(base), float(increment or 0))
+    except (OSError, ValueError) as error:
+        parser.error(str(error))
+    if args.depth is None and args.movetime is None and clock is None:
+        args.depth = BestMoveFinder.DEPTH
+
+    result = runMatch(newConfig, oldConfig, games=args.games, openings=openings, depth=args.depth,
+                      moveTime=args.movetime, clock=clock, workers=args.workers, pgnPath=args.pgn,
+                      sprt=(args.sprt[0], args.sprt[1], args.alpha, args.beta) if args.sprt else None,
+                      maxPlies=args.max_plies, seed=args.seed)
+    print("%d games: +%d =%d -%d, new is %.1f +- %.1f Elo %s than old" %
+          (result['games'], result['wins'], result['draws'], result['losses'], abs(result['elo']),
+           result['eloMargin'], "stronger" if result['elo'] >= 0 else "weaker"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
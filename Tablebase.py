@@ -0,0 +1,561 @@
+"""
+Endgame tablebases for positions with few pieces.
+Responsible for :
+-probing win / draw / loss & DTZ (plies to the next capture or pawn move) of a position from memory-mapped table files
+-picking the move that wins fastest, or loses slowest, by probing every move's resulting position
+-generating the tables locally by retrograde analysis, for any material of up to 4 pieces kings included
+Run `python Tablebase.py --dir tables` to generate every 3 & 4 piece table into directory tables.
+Tables are one byte per position, not compressed the way Syzygy files are, so Syzygy files can't be read.
+Positions with castling rights or a capturable en-passant pawn aren't probed, and en passant isn't played out
+while generating, so a few pawn against pawn results are wrong. The 50 move rule is ignored.
+"""
+
+import argparse
+import itertools
+import mmap
+import os
+import sys
+import time
+
+import numpy as np
+
+from ChessEngine import ROOK_DIRECTIONS, BISHOP_DIRECTIONS, KING_DIRECTIONS, KNIGHT_DIRECTIONS, PROMOTION_PIECES
+
+MAX_PIECES = 4  # biggest tables the generator builds, 5 pieces would need 2 GB per table
+FILE_EXTENSION = '.tb'
+
+# piece letters of a material key like 'KQvKR', each side's pieces in this order. strongest side comes first
+PIECE_ORDER = 'KQRBNP'
+PIECE_VALUES = {'K': 0, 'Q': 9, 'R': 5, 'B': 3, 'N': 3, 'P': 1}
+
+# byte stored per position, from side to move's point of view
+DRAW = 0  # 1 - 127 is a win with that DTZ
+LOSS = 128  # + DTZ, a checkmated side has lost with DTZ 0
+ILLEGAL = 255  # pieces on one square, pawn on a back rank or side not to move in check
+
+# moves as seen by the generator
+PIECE_MOVE = 0  # non-pawn move to an empty square, position stays in the same table
+PAWN_MOVE = 1  # pawn push that doesn't promote, same table but resets DTZ
+CONVERSION = 2  # capture or promotion, position moves to a table of other material
+
+CHUNK_SIZE = 1 << 18  # positions handled at once by the generator, bounds its memory use
+
+SLIDING_DIRECTIONS = {'Q': KING_DIRECTIONS, 'R': ROOK_DIRECTIONS, 'B': BISHOP_DIRECTIONS}
+
+
+def sideStrength(letters):
+    # stronger side of a material key goes first, ties broken by piece order
+    return sum(PIECE_VALUES[letter] for letter in letters), [-PIECE_ORDER.index(letter) for letter in letters]
+
+
+def materialKey(white, black):
+    """
+    key of table holding given white & black pieces, eg ('KR', 'KQ') -> ('KQvKR', True).
+    second value says colors are swapped in the table, white's pieces then play as black & board is flipped
+    """
+    white = ''.join(sorted(white, key=PIECE_ORDER.index))
+    black = ''.join(sorted(black, key=PIECE_ORDER.index))
+    if sideStrength(black) > sideStrength(white):
+        return black + 'v' + white, True
+    return white + 'v' + black, False
+
+
+def tablePieces(key):
+    # [(side, letter)] of a material key in table order, side 0 is the side written first
+    strong, weak = key.split('v')
+    return [(0, letter) for letter in strong] + [(1, letter) for letter in weak]
+
+
+def tableIndex(pieces, stm):
+    """
+    (key, index) of a position, given as [(side, letter, square)] with side 0 = white & side to move stm.
+    square is row * 8 + col, works on numpy arrays of squares as well as on ints
+    """
+    key, swap = materialKey(''.join(letter for side, letter, _ in pieces if side == 0),
+                             ''.join(letter for side, letter, _ in pieces if side == 1))
+    if swap:
+        # flipping rows keeps pawns moving the right way once colors are swapped
+        pieces = [(1 - side, letter, square ^ 56) for side, letter, square in pieces]
+        stm = 1 - stm
+    remaining = list(pieces)
+    index = np.int64(stm)
+    for side, letter in tablePieces(key):
+        piece = next(piece for piece in remaining if piece[0] == side and piece[1] == letter)
+        remaining.remove(piece)
+        index = index * 64 + piece[2]
+    return key, index
+
+
+def decode(code):
+    # (wdl, dtz) of a stored byte, wdl is 1 win, 0 draw, -1 loss for side to move
+    if code == DRAW or code == ILLEGAL:
+        return 0, 0
+    if code < LOSS:
+        return 1, code
+    return -1, code - LOSS
+
+
+class Tablebase:
+    """
+    table files of one directory, each mapped into memory the first time a position of its material is probed.
+    probing reads a single byte, so it's cheap enough to be done inside the search
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.tables = {}  # material key -> mmap, None if there's no file for it
+
+    def close(self):
+        for table in self.tables.values():
+            if table is not None:
+                table.close()
+        self.tables = {}
+
+    def table(self, key):
+        if key not in self.tables:
+            path = os.path.join(self.directory, key + FILE_EXTENSION)
+            table = None
+            if os.path.isfile(path):
+                with open(path, 'rb') as file:
+                    table = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                if len(table) != 2 * 64 ** len(tablePieces(key)):
+                    table.close()
+                    raise ValueError("tablebase file has wrong size: " + path)
+            self.tables[key] = table
+        return self.tables[key]
+
+    def probe(self, gs):
+        # (wdl, dtz) of position for side to move, None when it isn't in the tables
+        rights = gs.currentCastlingRight
+        if rights.wks or rights.wqs or rights.bks or rights.bqs:
+            return None
+        pieces = []
+        for r in range(8):
+            for c in range(8):
+                piece = gs.board[r, c]
+                if piece != '--':
+                    if len(pieces) == MAX_PIECES:
+                        return None
+                    pieces.append((0 if piece[0] == 'w' else 1, 'P' if piece[1] == 'p' else piece[1], r * 8 + c))
+        if gs.enpassantPossible != ():
+            # tables don't know about en passant, only positions where it can't be played are probed
+            r, c = gs.enpassantPossible
+            pawn, pawnRow = ('wp', r + 1) if gs.whiteToMove else ('bp', r - 1)
+            if any(0 <= c + dc < 8 and gs.board[pawnRow, c + dc] == pawn for dc in (-1, 1)):
+                return None
+
+        key, index = tableIndex(pieces, 0 if gs.whiteToMove else 1)
+        table = self.table(key)
+        if table is None:
+            return None
+        return decode(table[index])
+
+    def bestMove(self, gs, validMoves):
+        """
+        (move, wdl, dtz) of best move by the tables, None if a position on the way isn't in them.
+        wins go for mate, else for the quickest capture or pawn move that keeps the win, losses hold out longest
+        """
+        if len(validMoves) == 0 or self.probe(gs) is None:
+            return None
+        best = None
+        bestRank = None
+        for move in validMoves:
+            gs.makeMove(move)
+            result = self.probe(gs)
+            gs.undoMove()
+            if result is None:
+                return None
+            wdl, dtz = -result[0], result[1]
+            zeroing = move.isCapture or move.pieceMoved[1] == 'p'
+            moveDtz = 1 if zeroing else dtz + 1
+            if wdl > 0:
+                rank = (1, -(0 if dtz == 0 else moveDtz))  # dtz 0 means the move mates
+            elif wdl < 0:
+                rank = (-1, moveDtz)
+            else:
+                rank = (0, 0)
+            if bestRank is None or rank > bestRank:
+                best = (move, wdl, 0 if wdl == 0 else moveDtz)
+                bestRank = rank
+        return best
+
+
+def pieceCount(gs):
+    # number of pieces on the board, kings included
+    return int(np.count_nonzero(gs.board != '--'))
+
+
+# generator: everything below works on numpy arrays holding one square per position, a chunk of positions at a time
+
+def positionSquares(indices, pieceTotal):
+    # square of each piece in positions given by table index, in table order
+    # int8 keeps arrays small & quick to work on, indices are put together again in int64
+    return [((indices >> (6 * (pieceTotal - 1 - i))) & 63).astype(np.int8) for i in range(pieceTotal)]
+
+
+def attacks(side, letter, square, target, blockers):
+    # whether piece attacks target square, blockers are squares of pieces that may stand in between
+    dr = (target >> 3) - (square >> 3)
+    dc = (target & 7) - (square & 7)
+    adr, adc = np.abs(dr), np.abs(dc)
+    if letter == 'K':
+        return np.maximum(adr, adc) == 1
+    if letter == 'N':
+        return adr * adc == 2
+    if letter == 'P':
+        return (dr == (-1 if side == 0 else 1)) & (adc == 1)
+    straight = (dr == 0) != (dc == 0)
+    diagonal = (adr == adc) & (adr != 0)
+    line = straight if letter == 'R' else diagonal if letter == 'B' else straight | diagonal
+    distance = np.maximum(adr, adc)
+    for blocker in blockers:
+        bdr = (blocker >> 3) - (square >> 3)
+        bdc = (blocker & 7) - (square & 7)
+        between = (np.sign(bdr) == np.sign(dr)) & (np.sign(bdc) == np.sign(dc)) & (bdr * dc == bdc * dr) & \
+                  (np.maximum(np.abs(bdr), np.abs(bdc)) < distance)
+        line = line & ~between
+    return line
+
+
+def illegalPositions(pieces, stm, squares):
+    # pieces sharing a square, pawns on first or last rank & positions where side to move could take the king
+    illegal = np.zeros(len(squares[0]), dtype=bool)
+    for i, j in itertools.combinations(range(len(pieces)), 2):
+        illegal |= squares[i] == squares[j]
+    for (side, letter), square in zip(pieces, squares):
+        if letter == 'P':
+            illegal |= ((square >> 3) == 0) | ((square >> 3) == 7)
+    king = squares[pieces.index((1 - stm, 'K'))]
+    for i, (side, letter) in enumerate(pieces):
+        if side == stm:
+            blockers = [square for j, square in enumerate(squares) if j != i]
+            illegal |= attacks(side, letter, squares[i], king, blockers)
+    return illegal
+
+
+def pieceSteps(letter, k, squares):
+    """
+    yields (target, mask, hit) for each square a non-pawn piece k may go to:
+    mask says target is on board & path to it is free, hit is the piece standing on target or -1
+    """
+    r, c = squares[k] >> 3, squares[k] & 7
+    if letter in SLIDING_DIRECTIONS:
+        directions, reach = SLIDING_DIRECTIONS[letter], 7
+    else:
+        directions, reach = (KING_DIRECTIONS if letter == 'K' else KNIGHT_DIRECTIONS), 1
+    for dr, dc in directions:
+        free = None
+        for distance in range(1, reach + 1):
+            tr, tc = r + dr * distance, c + dc * distance
+            mask = (tr >= 0) & (tr < 8) & (tc >= 0) & (tc < 8)
+            if free is not None:
+                mask &= free
+            if not mask.any():
+                break
+            target = (tr * 8 + tc) & 63
+            hit = np.full(len(target), -1, dtype=np.int8)
+            for j, square in enumerate(squares):
+                if j != k:
+                    hit[square == target] = j
+            yield target, mask, hit
+            free = mask & (hit < 0)
+
+
+def forwardMoves(pieces, stm, squares):
+    """
+    yields (kind, childKey, childIndex, where) for each kind of move side to move can make in a chunk,
+    where holds positions in chunk that have the move.
+    moves may still leave the king in check, the child is illegal then
+    """
+    def move(kind, mask, moved, target, captured=None, promotion=None):
+        # child positions after piece moved goes to target, only worked out where mask is set
+        where = np.flatnonzero(mask)
+        childPieces = []
+        for i, ((side, letter), square) in enumerate(zip(pieces, squares)):
+            if i == moved:
+                childPieces.append((side, promotion or letter, target[where]))
+            elif i != captured:
+                childPieces.append((side, letter, square[where]))
+        return (kind,) + tableIndex(childPieces, 1 - stm) + (where,)
+
+    enemies = [j for j, (side, letter) in enumerate(pieces) if side != stm and letter != 'K']
+    for k, (side, letter) in enumerate(pieces):
+        if side != stm:
+            continue
+        if letter != 'P':
+            for target, mask, hit in pieceSteps(letter, k, squares):
+                quiet = mask & (hit < 0)
+                if quiet.any():
+                    yield move(PIECE_MOVE, quiet, k, target)
+                for j in enemies:
+                    capture = mask & (hit == j)
+                    if capture.any():
+                        yield move(CONVERSION, capture, k, target, j)
+            continue
+
+        forward = -8 if stm == 0 else 8
+        r, c = squares[k] >> 3, squares[k] & 7
+        promotionRow, startRow = (0, 6) if stm == 0 else (7, 1)
+        target = (squares[k] + forward) & 63
+        doubleTarget = (target + forward) & 63
+        occupied = np.zeros(len(target), dtype=bool)
+        doubleOccupied = np.zeros(len(target), dtype=bool)
+        for j, square in enumerate(squares):
+            if j != k:
+                occupied |= square == target
+                doubleOccupied |= square == doubleTarget
+        onBoard = (r != 0) & (r != 7)  # pawns on back ranks only show up in illegal positions
+        push = onBoard & ~occupied
+        promoting = (target >> 3) == promotionRow
+        if (push & ~promoting).any():
+            yield move(PAWN_MOVE, push & ~promoting, k, target)
+        if (push & promoting).any():
+            for promotion in PROMOTION_PIECES:
+                yield move(CONVERSION, push & promoting, k, target, promotion=promotion)
+        double = push & (r == startRow) & ~doubleOccupied
+        if double.any():
+            yield move(PAWN_MOVE, double, k, doubleTarget)
+
+        for dc in (-1, 1):
+            captureTarget = (target + dc) & 63
+            mask = onBoard & (c + dc >= 0) & (c + dc < 8)
+            for j in enemies:
+                capture = mask & (squares[j] == captureTarget)
+                if (capture & ~promoting).any():
+                    yield move(CONVERSION, capture & ~promoting, k, captureTarget, j)
+                if (capture & promoting).any():
+                    for promotion in PROMOTION_PIECES:
+                        yield move(CONVERSION, capture & promoting, k, captureTarget, j, promotion)
+
+
+def retroMoves(pieces, stm, squares, pawnMoves):
+    """
+    yields (parentIndex, where) for moves that could have led to positions of a chunk without changing material,
+    where holds the positions that have such a parent. side not to move made the moves,
+    pawn pushes are only included if pawnMoves is set
+    """
+    mover = 1 - stm
+
+    def parent(mask, moved, origin):
+        where = np.flatnonzero(mask)
+        index = np.int64(mover)
+        for i, square in enumerate(squares):
+            index = index * 64 + (origin[where] if i == moved else square[where])
+        return index, where
+
+    for k, (side, letter) in enumerate(pieces):
+        if side != mover:
+            continue
+        if letter != 'P':
+            for origin, mask, hit in pieceSteps(letter, k, squares):
+                quiet = mask & (hit < 0)
+                if quiet.any():
+                    yield parent(quiet, k, origin)
+            continue
+        if not pawnMoves:
+            continue
+        backward = 8 if mover == 0 else -8
+        r = squares[k] >> 3
+        origin = (squares[k] + backward) & 63
+        doubleOrigin = (origin + backward) & 63
+        occupied = np.zeros(len(origin), dtype=bool)
+        doubleOccupied = np.zeros(len(origin), dtype=bool)
+        for j, square in enumerate(squares):
+            if j != k:
+                occupied |= square == origin
+                doubleOccupied |= square == doubleOrigin
+        # pawn can't have come from its own back rank
+        single = ~occupied & ((r < 6) if mover == 0 else (r > 1)) & (r != 0) & (r != 7)
+        if single.any():
+            yield parent(single, k, origin)
+        double = single & ~doubleOccupied & (r == (4 if mover == 0 else 3))
+        if double.any():
+            yield parent(double, k, doubleOrigin)
+
+
+def chunks(indices, half):
+    # splits sorted table indices into chunks that each have one side to move
+    split = np.searchsorted(indices, half)
+    for part in (indices[:split], indices[split:]):
+        for start in range(0, len(part), CHUNK_SIZE):
+            chunk = part[start:start + CHUNK_SIZE]
+            yield chunk, int(chunk[0] >= half)
+
+
+def solve(pieces, illegal, inCheck, subtables, pawnZeroing, knownResult):
+    """
+    retrograde analysis of one table, returns (result, dtz) arrays, result 1 win, 0 draw, -1 loss.
+    positions resolved by moves into other tables (captures & promotions, plus pawn pushes when pawnZeroing is set)
+    count 1 ply, their result is taken from subtables or from knownResult of an earlier solve of this table.
+    the rest goes backwards from checkmates: a position is won once a move reaches a lost one, lost once
+    every move reaches a won one. positions resolved in pass n have DTZ n, what's never resolved is a draw
+    """
+    pieceTotal = len(pieces)
+    half = 64 ** pieceTotal
+    size = 2 * half
+    result = np.zeros(size, dtype=np.int8)
+    dtz = np.zeros(size, dtype=np.int16)
+    decided = illegal.copy()
+    remaining = np.zeros(size, dtype=np.int16)  # moves not yet known to lose, position is lost when none are left
+    longest = np.zeros(size, dtype=np.int16)  # DTZ a lost position has, longest of its moves
+    zeroingWin = np.zeros(size, dtype=bool)
+
+    # pass 0: count legal moves & settle moves that leave this table, or reset DTZ
+    for chunk, stm in chunks(np.arange(size, dtype=np.int64), half):
+        squares = positionSquares(chunk, pieceTotal)
+        moveCount = np.zeros(len(chunk), dtype=np.int16)
+        zeroingLosses = np.zeros(len(chunk), dtype=np.int16)
+        for kind, childKey, childIndex, where in forwardMoves(pieces, stm, squares):
+            if kind == CONVERSION:
+                codes = subtables[childKey][childIndex]
+                legal = codes != ILLEGAL
+                childResult = np.where(codes == DRAW, 0, np.where(codes < LOSS, 1, -1))
+            else:
+                legal = ~illegal[childIndex]
+                childResult = knownResult[childIndex] if knownResult is not None else None
+            moveCount[where] += legal
+            if kind == CONVERSION or (kind == PAWN_MOVE and pawnZeroing):
+                zeroingWin[chunk[where[legal & (childResult == -1)]]] = True
+                zeroingLosses[where] += legal & (childResult == 1)
+        remaining[chunk] = moveCount - zeroingLosses
+        longest[chunk] = zeroingLosses > 0
+        noMoves = (moveCount == 0) & ~illegal[chunk]
+        # checkmate is lost with DTZ 0, stalemate is a draw
+        mated = chunk[noMoves & inCheck[chunk]]
+        result[mated] = -1
+        decided[chunk[noMoves]] = True
+
+    frontier = np.flatnonzero(decided & (result == -1))
+    passNumber = 0
+    while passNumber == 0 or len(frontier):
+        passNumber += 1
+        wins = []
+        losses = []
+        if passNumber == 1:
+            # won by a zeroing move, or lost because every move is a zeroing move that loses
+            wins.append(np.flatnonzero(~decided & zeroingWin))
+            losses.append(np.flatnonzero(~decided & (remaining == 0)))
+        for chunk, stm in chunks(frontier, half):
+            squares = positionSquares(chunk, pieceTotal)
+            chunkLost = result[chunk] == -1
+            for parents, where in retroMoves(pieces, stm, squares, not pawnZeroing):
+                lost = chunkLost[where]
+                parentsOfLost = parents[lost]
+                wins.append(parentsOfLost[~decided[parentsOfLost]])
+                parentsOfWon = parents[~lost]
+                parentsOfWon = parentsOfWon[~decided[parentsOfWon]]
+                if len(parentsOfWon):
+                    parentsOfWon, counts = np.unique(parentsOfWon, return_counts=True)
+                    remaining[parentsOfWon] -= counts.astype(np.int16)
+                    longest[parentsOfWon] = passNumber
+                    losses.append(parentsOfWon[remaining[parentsOfWon] == 0])
+
+        newWins = np.unique(np.concatenate(wins)) if wins else np.zeros(0, dtype=np.int64)
+        newWins = newWins[~decided[newWins]]
+        newLosses = np.unique(np.concatenate(losses)) if losses else np.zeros(0, dtype=np.int64)
+        newLosses = newLosses[~decided[newLosses]]
+        newLosses = np.setdiff1d(newLosses, newWins, assume_unique=True)
+        result[newWins] = 1
+        dtz[newWins] = passNumber
+        result[newLosses] = -1
+        dtz[newLosses] = longest[newLosses]
+        decided[newWins] = True
+        decided[newLosses] = True
+        frontier = np.union1d(newWins, newLosses)
+    return result, dtz
+
+
+def generateTable(key, subtables, log=None):
+    # stored bytes of table for material key, subtables must hold every table its captures & promotions lead to
+    pieces = tablePieces(key)
+    pieceTotal = len(pieces)
+    half = 64 ** pieceTotal
+    size = 2 * half
+    illegal = np.zeros(size, dtype=bool)
+    for chunk, stm in chunks(np.arange(size, dtype=np.int64), half):
+        illegal[chunk] = illegalPositions(pieces, stm, positionSquares(chunk, pieceTotal))
+    # side to move is in check if the same position with the other side to move is illegal
+    inCheck = np.roll(illegal, half) & ~illegal
+
+    start = time.perf_counter()
+    result, dtz = solve(pieces, illegal, inCheck, subtables, False, None)
+    if 'P' in key:
+        # pawn pushes stay in this table but reset DTZ, so result is needed first to count them as zeroing moves
+        result, dtz = solve(pieces, illegal, inCheck, subtables, True, result)
+    if log is not None:
+        print("%s: %d wins, %d draws, %d losses, longest DTZ %d, %.1fs" %
+              (key, np.count_nonzero(result == 1), np.count_nonzero((result == 0) & ~illegal),
+               np.count_nonzero(result == -1), dtz.max(), time.perf_counter() - start), file=log)
+    if dtz.max() >= LOSS - 1:
+        raise ValueError("DTZ too long to store in table " + key)
+    codes = np.where(result == 1, dtz, np.where(result == -1, LOSS + dtz, DRAW)).astype(np.uint8)
+    codes[illegal] = ILLEGAL
+    return codes
+
+
+def subtableKeys(key):
+    # material keys of tables a capture or promotion in table key leads to
+    keys = set()
+    pieces = tablePieces(key)
+    for i, (side, letter) in enumerate(pieces):
+        others = [piece for j, piece in enumerate(pieces) if j != i]
+        if letter != 'K':
+            keys.add(materialKeyOf(others))
+        if letter == 'P':
+            for promotion in PROMOTION_PIECES:
+                keys.add(materialKeyOf(others + [(side, promotion)]))
+                for j, (otherSide, otherLetter) in enumerate(pieces):
+                    if otherSide != side and otherLetter != 'K':
+                        rest = [piece for m, piece in enumerate(pieces) if m not in (i, j)]
+                        keys.add(materialKeyOf(rest + [(side, promotion)]))
+    return keys
+
+
+def materialKeyOf(pieces):
+    return materialKey(''.join(letter for side, letter in pieces if side == 0),
+                       ''.join(letter for side, letter in pieces if side == 1))[0]
+
+
+def generate(key, directory, log=None):
+    # writes table file for material key & every table it depends on that's missing, returns its bytes
+    path = os.path.join(directory, key + FILE_EXTENSION)
+    if os.path.isfile(path):
+        return np.fromfile(path, dtype=np.uint8)
+    subtables = {subkey: generate(subkey, directory, log) for subkey in subtableKeys(key)}
+    codes = generateTable(key, subtables, log)
+    os.makedirs(directory, exist_ok=True)
+    codes.tofile(path + '.tmp')
+    os.replace(path + '.tmp', path)  # a half written file is never taken for a table
+    return codes
+
+
+def allMaterialKeys(maxPieces):
+    # every material key with 2 kings & up to maxPieces pieces
+    keys = set()
+    for extra in range(maxPieces - 1):
+        for letters in itertools.combinations_with_replacement('QRBNP', extra):
+            for split in range(extra + 1):
+                for whiteLetters in itertools.combinations(range(extra), split):
+                    white = 'K' + ''.join(letters[i] for i in whiteLetters)
+                    black = 'K' + ''.join(letters[i] for i in range(extra) if i not in whiteLetters)
+                    keys.add(materialKey(white, black)[0])
+    return sorted(keys, key=lambda key: (len(key), key))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate endgame tablebase files")
+    parser.add_argument('--dir', default='tablebases', help="directory tables are written to")
+    parser.add_argument('--pieces', type=int, default=MAX_PIECES, help="generate every table up to this many pieces")
+    parser.add_argument('keys', nargs='*', help="material keys to generate instead, eg KQvK KRvKB")
+    args = parser.parse_args(argv)
+    if args.pieces > MAX_PIECES or any(len(key) - 1 > MAX_PIECES for key in args.keys):
+        parser.error("tables of more than %d pieces aren't supported" % MAX_PIECES)
+    keys = args.keys or allMaterialKeys(args.pieces)
+    for key in keys:
+        canonical = materialKey(*key.upper().split('V'))[0]
+        generate(canonical, args.dir, sys.stdout)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
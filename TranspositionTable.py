@@ -0,0 +1,93 @@
+"""
+Fixed size transposition table used by the search.
+Responsible for :
+-remembering depth, score, bound type & best move of positions already searched, keyed by Zobrist key
+-keeping memory capped: entries live in a preallocated numpy array and are replaced, never appended
+-living in a buffer shared between processes, with entries checked so no locks are needed
+"""
+
+import numpy as np
+
+# bound type of a stored score, 0 marks an empty slot
+EXACT = 1
+LOWER_BOUND = 2  # search failed high, real score is at least this
+UPPER_BOUND = 3  # search failed low, real score is at most this
+
+ENTRY_BYTES = 16  # 8 bytes of key + 8 bytes of packed data
+# key field holds Zobrist key XOR data, an entry half written by another process fails the check & reads as a miss
+ENTRY_DTYPE = np.dtype([('key', np.uint64), ('data', np.uint64)])
+SLOTS_PER_BUCKET = 2  # slot 0 keeps the deepest search, slot 1 is always replaced
+
+# layout of the packed data word
+SCORE_OFFSET = 1 << 31  # scores are stored unsigned in the low 32 bits
+DEPTH_SHIFT = 32
+FLAG_SHIFT = 40
+MOVE_SHIFT = 42
+GENERATION_SHIFT = 58
+
+
+def bucketCount(sizeMB):
+    # largest power of 2 number of buckets fitting in sizeMB
+    buckets = 1
+    while buckets * 2 * SLOTS_PER_BUCKET * ENTRY_BYTES <= sizeMB * 1024 * 1024:
+        buckets *= 2
+    return buckets
+
+
+def tableBytes(sizeMB):
+    # size of buffer a table of sizeMB needs, for allocating shared memory
+    return bucketCount(sizeMB) * SLOTS_PER_BUCKET * ENTRY_BYTES
+
+
+class TranspositionTable:
+    def __init__(self, sizeMB=16, buffer=None):
+        self.resize(sizeMB, buffer)
+
+    def resize(self, sizeMB, buffer=None):
+        """
+        allocates the largest power of 2 number of buckets fitting in sizeMB, dropping all entries.
+        with a buffer (eg multiprocessing.shared_memory's buf, at least tableBytes(sizeMB) long) entries are
+        kept in it instead, & its contents are left as they are, so every process can attach to the same table
+        """
+        buckets = bucketCount(sizeMB)
+        self.sizeMB = sizeMB
+        self.bucketMask = buckets - 1
+        if buffer is None:
+            self.entries = np.zeros(buckets * SLOTS_PER_BUCKET, dtype=ENTRY_DTYPE)
+        else:
+            self.entries = np.ndarray(buckets * SLOTS_PER_BUCKET, dtype=ENTRY_DTYPE, buffer=buffer)
+        self.keys = self.entries['key']
+        self.data = self.entries['data']
+        self.generation = 0
+
+    def clear(self):
+        self.entries.fill(0)
+        self.generation = 0
+
+    def newSearch(self):
+        # entries of earlier searches become first choice for replacement in depth-preferred slot
+        self.generation = (self.generation + 1) & 0x3F
+
+    def probe(self, key):
+        # returns (depth, score, flag, moveID) stored for the position, or None if it isn't in the table
+        slot = (key & self.bucketMask) * SLOTS_PER_BUCKET
+        for i in (slot, slot + 1):
+            data = int(self.data[i])
+            if data and int(self.keys[i]) ^ data == key:
+                return ((data >> DEPTH_SHIFT) & 0xFF, (data & 0xFFFFFFFF) - SCORE_OFFSET,
+                        (data >> FLAG_SHIFT) & 0x3, (data >> MOVE_SHIFT) & 0xFFFF)
+        return None
+
+    def store(self, key, depth, score, flag, moveID):
+        # two-tier replacement: deeper (or same position / older search) results take the depth-preferred slot,
+        # everything else goes to the always-replace slot
+        slot = (key & self.bucketMask) * SLOTS_PER_BUCKET
+        data = ((score + SCORE_OFFSET) | depth << DEPTH_SHIFT | flag << FLAG_SHIFT | (moveID or 0) << MOVE_SHIFT |
+                self.generation << GENERATION_SHIFT)
+
+        storedData = int(self.data[slot])
+        if not (int(self.keys[slot]) ^ storedData == key or (storedData >> GENERATION_SHIFT) != self.generation or
+                depth >= (storedData >> DEPTH_SHIFT) & 0xFF):
+            slot += 1
+        self.keys[slot] = key ^ data
+        self.data[slot] = data
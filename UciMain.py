@@ -0,0 +1,255 @@
+"""
+UCI driver file, for playing the engine from tournament managers & other chess GUIs.
+Responsible for :
+-reading UCI commands from stdin & answering on stdout
+-setting up positions from startpos / FEN plus moves
+-searching in a worker thread, so stop, isready & quit are answered while it thinks
+Run `python UciMain.py` & talk UCI to it.
+"""
+
+import multiprocessing
+import os
+import sys
+import threading
+
+import BestMoveFinder
+import BitboardEngine
+import OpeningBook
+import ParallelSearch
+import Tablebase
+from BestMoveFinder import CHECKMATE, MATE_THRESHOLD, MAX_DEPTH
+
+ENGINE_NAME = "Chess-AI"
+ENGINE_AUTHOR = "ankursinghbisht"
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+MAX_HASH_MB = 4096
+MOVES_TO_GO = 30  # moves left to plan for when GUI doesn't say
+MOVE_OVERHEAD = 0.05  # seconds kept back per move for communication
+
+
+class UciEngine:
+    def __init__(self, out=sys.stdout):
+        self.out = out
+        self.outputLock = threading.Lock()  # search thread & command loop both write
+        self.engine = BestMoveFinder.SearchEngine()
+        self.engine.onIteration = self.sendInfo
+        self.threads = 1
+        self.ownBook = False
+        self.bookFile = ''
+        self.gs = BitboardEngine.GameState.fromFen(START_FEN)
+        self.searchThread = None
+        self.stopEvent = None
+
+    def send(self, line):
+        with self.outputLock:
+            print(line, file=self.out, flush=True)
+
+    def run(self, lines=sys.stdin):
+        # command loop, returns on quit or end of input
+        for line in lines:
+            if not self.handleCommand(line.split()):
+                break
+        self.stopSearch()
+
+    def handleCommand(self, tokens):
+        # carries out one command, returns False on quit. unknown commands are ignored, as UCI asks
+        if not tokens:
+            return True
+        command = tokens[0]
+        if command == 'uci':
+            self.send("id name " + ENGINE_NAME)
+            self.send("id author " + ENGINE_AUTHOR)
+            self.send("option name Hash type spin default %d min 1 max %d" % (BestMoveFinder.TT_SIZE_MB, MAX_HASH_MB))
+            self.send("option name Threads type spin default 1 min 1 max %d" % (os.cpu_count() or 1))
+            self.send("option name OwnBook type check default false")
+            self.send("option name BookFile type string default <empty>")
+            self.send("option name TablebasePath type string default <empty>")
+            self.send("option name SearchStats type check default false")
+            self.send("uciok")
+        elif command == 'isready':
+            self.send("readyok")
+        elif command == 'setoption':
+            self.setOption(tokens)
+        elif command == 'ucinewgame':
+            self.stopSearch()
+            self.engine.clear()
+        elif command == 'position':
+            self.stopSearch()
+            self.setPosition(tokens)
+        elif command == 'go':
+            self.stopSearch()
+            self.startSearch(tokens)
+        elif command == 'stop':
+            self.stopSearch()
+        elif command == 'quit':
+            return False
+        return True
+
+    def setOption(self, tokens):
+        # setoption name <id> value <x>
+        if 'name' not in tokens or 'value' not in tokens:
+            return
+        name = ' '.join(tokens[tokens.index('name') + 1:tokens.index('value')]).lower()
+        value = ' '.join(tokens[tokens.index('value') + 1:])  # file names may contain spaces
+        if name == 'hash' and value.isdigit():
+            self.stopSearch()
+            self.engine.transpositionTable.resize(min(max(int(value), 1), MAX_HASH_MB))
+        elif name == 'threads' and value.isdigit():
+            self.threads = max(int(value), 1)
+        elif name == 'ownbook':
+            self.ownBook = value.lower() == 'true'
+            self.openBook()
+        elif name == 'bookfile':
+            self.bookFile = '' if value == '<empty>' else value
+            self.openBook()
+        elif name == 'tablebasepath':
+            self.stopSearch()
+            if self.engine.tablebase is not None:
+                self.engine.tablebase.close()
+            # table files are only opened once a position of their material is probed
+            self.engine.tablebase = Tablebase.Tablebase(value) if value and value != '<empty>' else None
+        elif name == 'searchstats':
+            self.engine.collectStats = value.lower() == 'true'
+
+    def openBook(self):
+        # book is only used with OwnBook on & a BookFile set, a file that can't be opened is reported & skipped
+        self.stopSearch()
+        if self.engine.book is not None:
+            self.engine.book.close()
+            self.engine.book = None
+        if self.ownBook and self.bookFile:
+            try:
+                self.engine.book = OpeningBook.OpeningBook(self.bookFile)
+            except OSError as error:
+                self.send("info string can't open book: " + str(error))
+
+    def setPosition(self, tokens):
+        # position startpos | fen <6 fields> [moves <move> ...]
+        movesIndex = tokens.index('moves') if 'moves' in tokens else len(tokens)
+        if len(tokens) > 1 and tokens[1] == 'fen':
+            fen = ' '.join(tokens[2:movesIndex])
+        else:
+            fen = START_FEN
+        try:
+            self.gs = BitboardEngine.GameState.fromFen(fen)
+        except ValueError as error:
+            self.send("info string " + str(error))
+            return
+        for moveText in tokens[movesIndex + 1:]:
+            move = self.findMove(moveText)
+            if move is None:
+                self.send("info string illegal move " + moveText)
+                break
+            self.gs.makeMove(move)
+
+    def findMove(self, moveText):
+        # legal move matching long algebraic notation, eg e2e4 or e7e8q
+        for move in self.gs.getValidMoves():
+            if move.getChessNotation() == moveText:
+                return move
+        return None
+
+    def startSearch(self, tokens):
+        # go [depth d] [movetime ms] [wtime ms] [btime ms] [winc ms] [binc ms] [movestogo n] [nodes n] [infinite]
+        limits = {}
+        for i, token in enumerate(tokens[:-1]):
+            if token in ('depth', 'movetime', 'wtime', 'btime', 'winc', 'binc', 'movestogo', 'nodes') and \
+                    tokens[i + 1].lstrip('-').isdigit():
+                limits[token] = int(tokens[i + 1])
+
+        depth = limits.get('depth', MAX_DEPTH if 'infinite' in tokens or len(limits) == 0 else None)
+        timeLimit = None
+        if 'movetime' in limits:
+            timeLimit = max(limits['movetime'] / 1000 - MOVE_OVERHEAD, 0.01)
+        elif 'infinite' not in tokens:
+            timeLeft, increment = ('wtime', 'winc') if self.gs.whiteToMove else ('btime', 'binc')
+            if timeLeft in limits:
+                timeLimit = timeForMove(limits[timeLeft] / 1000, limits.get(increment, 0) / 1000,
+                                        limits.get('movestogo', MOVES_TO_GO))
+        if depth is None:
+            depth = MAX_DEPTH if timeLimit is not None or 'nodes' in limits else BestMoveFinder.DEPTH
+
+        validMoves = self.gs.getValidMoves()
+        if len(validMoves) == 0:
+            self.send("bestmove 0000")
+            return
+        if self.engine.book is not None and 'infinite' not in tokens:
+            # played straight away, infinite search has to wait for stop before answering
+            move = self.engine.book.pickMove(self.gs, validMoves, self.engine.random)
+            if move is not None:
+                self.send("info string book move")
+                self.sendBestMove(move)
+                return
+        infinite = 'infinite' in tokens
+        if self.threads > 1:
+            # lazy SMP workers are processes, so they need an event shared between processes
+            self.stopEvent = multiprocessing.Event()
+            target = self.searchLazySMP
+        else:
+            self.stopEvent = threading.Event()
+            target = self.search
+        args = (self.gs, validMoves, depth, timeLimit, limits.get('nodes'), infinite)
+        self.searchThread = threading.Thread(target=target, args=args, daemon=True)
+        self.searchThread.start()
+
+    def search(self, gs, validMoves, depth, timeLimit, maxNodes, infinite):
+        self.engine.depth = depth
+        move = self.engine.findBestMove(gs, validMoves, timeLimit=timeLimit, maxNodes=maxNodes, stop=self.stopEvent)
+        if self.engine.stats is not None:
+            self.send("info string stats " + self.engine.stats.toJson())
+        if infinite:
+            self.stopEvent.wait()  # search may end early, eg on a mate or a table hit, but bestmove waits for stop
+        self.sendBestMove(move or validMoves[0])
+
+    def searchLazySMP(self, gs, validMoves, depth, timeLimit, maxNodes, infinite):
+        move = ParallelSearch.findBestMoveLazySMP(gs, validMoves, depth=depth, workers=self.threads,
+                                                  timeLimit=timeLimit, stop=self.stopEvent,
+                                                  sizeMB=self.engine.transpositionTable.sizeMB, maxNodes=maxNodes,
+                                                  onIteration=self.sendIteration)
+        self.send("info nodes %d" % ParallelSearch.nodesSearched)
+        if infinite:
+            self.stopEvent.wait()
+        self.sendBestMove(move or validMoves[0])
+
+    def sendBestMove(self, move):
+        self.send("bestmove " + move.getChessNotation())
+
+    def stopSearch(self):
+        # ends search in progress, its thread sends bestmove before it finishes
+        if self.searchThread is not None:
+            self.stopEvent.set()
+            self.searchThread.join()
+            self.searchThread = None
+
+    def sendInfo(self, engine, gs):
+        # info line for each completed depth of single thread search
+        self.sendIteration(*ParallelSearch.iterationReport(engine, gs))
+
+    def sendIteration(self, depth, bestScore, nodes, elapsed, pv):
+        # info line for a completed depth, lazy SMP's main worker reports the same values from its process
+        if abs(bestScore) >= MATE_THRESHOLD:
+            # mate score is CHECKMATE less plies to mate, UCI counts moves of the side to move
+            mateIn = (CHECKMATE - abs(bestScore) + 1) // 2
+            score = "mate %d" % (mateIn if bestScore > 0 else -mateIn)
+        else:
+            score = "cp %d" % bestScore
+        self.send("info depth %d score %s nodes %d nps %d time %d pv %s" %
+                  (depth, score, nodes, nodes / max(elapsed, 0.001), elapsed * 1000, ' '.join(pv)))
+
+
+def timeForMove(timeLeft, increment, movesToGo=MOVES_TO_GO):
+    # even share of the clock for moves left, plus most of the increment, never more than half of it. in seconds
+    # a movestogo of 0 or below from the GUI counts as this being the last move before the time control
+    share = timeLeft / max(movesToGo, 1) + increment * 0.8
+    return max(min(share, timeLeft / 2) - MOVE_OVERHEAD, 0.01)
+
+
+def main():
+    # commands are read through a second file object on stdin. a process forked for lazy SMP closes sys.stdin,
+    # which would wait forever on the lock the command loop holds while it waits for input
+    with open(sys.stdin.fileno(), closefd=False) as commands:
+        UciEngine().run(commands)
+
+
+if __name__ == "__main__":
+    main()